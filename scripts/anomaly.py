@@ -0,0 +1,162 @@
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+import utils.query as q
+from datadog_api_client import Configuration
+from utils.deadline import Deadline
+
+HISTORY_DIR = Path(".cache/history")
+HOUR_MS = 3_600_000
+WEEK_HOURS = 168
+
+ANOMALY_DEFAULTS = {
+    "weeks": 2,
+    "yellow_z": 2.0,
+    "red_z": 3.0,
+}
+
+
+@dataclass
+class AnomalyScore:
+    current: float
+    baseline: float
+    deviation: float
+    weeks: int
+    alert_level: int
+
+
+@dataclass
+class History:
+    """
+    Hourly counts for one query. Buckets between covered_from and covered_to that are
+    missing from `starts` had no matching logs.
+    """
+    covered_from: int
+    covered_to: int
+    starts: np.ndarray
+    counts: np.ndarray
+
+
+def _history_path(key: str) -> Path:
+    return HISTORY_DIR / f"{key}.npz"
+
+
+def load_history(key: str) -> History | None:
+    path = _history_path(key)
+    if not path.exists():
+        return None
+    with np.load(path) as cached:
+        return History(int(cached["covered_from"]), int(cached["covered_to"]), cached["starts"], cached["counts"])
+
+
+def save_history(key: str, history: History):
+    HISTORY_DIR.mkdir(parents=True, exist_ok=True)
+    np.savez(
+        _history_path(key),
+        covered_from=history.covered_from,
+        covered_to=history.covered_to,
+        starts=history.starts,
+        counts=history.counts,
+    )
+
+
+def update_history(
+    dd_config: Configuration,
+    key: str,
+    query: str,
+    window_end: int,
+    weeks: int,
+    deadline: Deadline | None = None,
+) -> History:
+    """
+    Extend the cached hourly series up to window_end, fetching only buckets newer than the
+    cache. The newest cached hour is refetched since it may have been partial.
+    """
+    window_end = (window_end // HOUR_MS + 1) * HOUR_MS
+    oldest_needed = window_end - (weeks + 1) * WEEK_HOURS * HOUR_MS
+    history = load_history(key)
+
+    if history is None or history.covered_from > oldest_needed or history.covered_to < oldest_needed:
+        fetch_from = oldest_needed
+        starts, counts = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        covered_from = oldest_needed
+    else:
+        fetch_from = min(history.covered_to - HOUR_MS, window_end - HOUR_MS)
+        keep = history.starts < fetch_from
+        starts, counts = history.starts[keep], history.counts[keep]
+        covered_from = history.covered_from
+
+    fetched = q.query_log_count_timeseries(dd_config, query, (fetch_from, window_end), "1h", deadline=deadline)
+    if fetched:
+        new_starts, new_counts = np.array(fetched, dtype=np.float64).T
+        starts = np.concatenate([starts, new_starts.astype(np.int64)])
+        counts = np.concatenate([counts, new_counts])
+
+    # Keep the cache bounded to what the baseline can use
+    keep = starts >= oldest_needed
+    history = History(max(covered_from, oldest_needed), window_end, starts[keep], counts[keep])
+    save_history(key, history)
+    return history
+
+
+def score_window(history: History, window: tuple[int, int], current: float, weeks: int, yellow_z: float, red_z: float) -> AnomalyScore | None:
+    """
+    Compare the window's count (`current`, the same count the report shows) with the same
+    span of hours (and weekday) over the previous `weeks` weeks. Returns None when no full
+    baseline week is cached.
+    """
+    origin = history.covered_from // HOUR_MS
+    first_hour = window[0] // HOUR_MS - origin
+    last_hour = -(-window[1] // HOUR_MS) - origin
+    if first_hour < 0 or last_hour <= first_hour:
+        return None
+
+    dense = np.zeros(last_hour, dtype=np.float64)
+    index = history.starts // HOUR_MS - origin
+    in_range = (index >= 0) & (index < last_hour)
+    np.add.at(dense, index[in_range], history.counts[in_range])
+
+    # Row k holds the window's hours shifted back k + 1 weeks
+    hours = np.arange(first_hour, last_hour)
+    shifts = WEEK_HOURS * np.arange(1, weeks + 1)[:, None]
+    shifted = hours[None, :] - shifts
+    usable = shifted.min(axis=1) >= 0
+    if not usable.any():
+        return None
+
+    # The window rarely starts and ends on the hour, so each baseline hour only counts for the
+    # fraction of it the window covers; otherwise a 24h window is compared with 25 full hours
+    hour_starts = (hours + origin) * HOUR_MS
+    overlap = np.minimum(hour_starts + HOUR_MS, window[1]) - np.maximum(hour_starts, window[0])
+    weights = np.clip(overlap, 0, HOUR_MS) / HOUR_MS
+
+    baseline_totals = (dense[shifted[usable]] * weights).sum(axis=1)
+    baseline = baseline_totals.mean()
+    # Poisson floor so a flat, quiet baseline doesn't turn one extra log into a huge z-score
+    scale = max(baseline_totals.std(), np.sqrt(baseline), 1.0)
+    deviation = float((current - baseline) / scale)
+
+    if deviation >= red_z:
+        alert_level = 2
+    elif deviation >= yellow_z:
+        alert_level = 1
+    else:
+        alert_level = 0
+
+    return AnomalyScore(float(current), float(baseline), deviation, int(usable.sum()), alert_level)
+
+
+def score_query(
+    dd_config: Configuration,
+    key: str,
+    query: str,
+    window: tuple[int, int],
+    current: float,
+    settings: dict,
+    deadline: Deadline | None = None,
+) -> AnomalyScore | None:
+    settings = {**ANOMALY_DEFAULTS, **settings}
+    history = update_history(dd_config, key, query, window[1], settings["weeks"], deadline)
+    return score_window(history, window, current, settings["weeks"], settings["yellow_z"], settings["red_z"])
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import time
+
+from datadog_api_client import ApiClient, Configuration
+from datadog_api_client.v1.model.synthetics_get_api_test_latest_results_response import SyntheticsGetAPITestLatestResultsResponse
+from datadog_api_client.v2.model.logs_list_response import LogsListResponse
+
+from filemover import _to_record
+from utils.projection import project_page
+from utils.query import _json_loads
+
+# Compare the SDK model path with the raw_json fast path on the same response bytes. No API
+# calls are made; pages are synthesized with the shape Datadog returns.
+
+
+def _log_page(size: int, page: int) -> bytes:
+    data = [
+        {
+            "id": f"AQAAAY{page:06d}{i:06d}",
+            "type": "log",
+            "attributes": {
+                "timestamp": "2025-01-06T14:03:12.123Z",
+                "service": "filemover",
+                "host": f"ip-10-0-{i % 250}-{page % 250}",
+                "status": "error",
+                "message": f"run_job.sh result for job failed: job=ingest-{i % 40} exit=1",
+                "tags": ["env:ulp-prod", "kube_namespace:ulp-ktrs", f"pod_name:filemover-{i % 7}"],
+                "attributes": {
+                    "fm_job": {"name": f"ingest-{i % 40}", "attempt": i % 3},
+                    "http": {"status_code": 500, "url": "/api/v1/jobs"},
+                    "duration": 1234567,
+                },
+            },
+        }
+        for i in range(size)
+    ]
+    return json.dumps({"data": data, "meta": {"page": {"after": f"cursor-{page}"}}}).encode()
+
+
+def _synthetic_page(size: int) -> bytes:
+    results = [
+        {
+            "check_time": 1736172000000.0 - i * 60000,
+            "probe_dc": "aws:us-east-1",
+            "result_id": f"{i:019d}",
+            "status": 0,
+            "result": {"passed": i % 17 != 0, "timings": {"dns": 1.2, "tcp": 3.4, "firstByte": 120.5, "total": 130.1}},
+        }
+        for i in range(size)
+    ]
+    return json.dumps({"last_timestamp_fetched": 1736172000000, "results": results}).encode()
+
+
+def _time(label: str, func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    print(f"  {label:<36} {best * 1000:9.1f} ms")
+    return best
+
+
+def bench_logs(api_client: ApiClient, pages: list[bytes], repeat: int):
+    print(f"Logs: {len(pages)} pages")
+
+    def sdk_models():
+        for body in pages:
+            response = api_client.deserialize(body.decode(), (LogsListResponse,), True)
+            response.meta.to_dict()
+            [_to_record(log, False) for log in response.data]
+
+    def raw_json():
+        for body in pages:
+            response = _json_loads(body)
+            [_to_record(log, False) for log in response["data"]]
+
+    def raw_json_projected():
+        for body in pages:
+            project_page(_json_loads(body)["data"], ["timestamp", "@fm_job.name"])
+
+    sdk = _time("SDK models + filemover records", sdk_models, repeat)
+    fast = _time("raw_json + filemover records", raw_json, repeat)
+    _time("raw_json + fields projection", raw_json_projected, repeat)
+    print(f"  speedup {sdk / fast:.1f}x")
+
+
+def bench_synthetics(api_client: ApiClient, pages: list[bytes], repeat: int):
+    print(f"Synthetics: {len(pages)} pages")
+
+    def sdk_models():
+        for body in pages:
+            api_client.deserialize(body.decode(), (SyntheticsGetAPITestLatestResultsResponse,), True).to_dict()
+
+    def raw_json():
+        for body in pages:
+            _json_loads(body)
+
+    sdk = _time("SDK models + to_dict()", sdk_models, repeat)
+    fast = _time("raw_json", raw_json, repeat)
+    print(f"  speedup {sdk / fast:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SDK model deserialization against the raw_json fast path.")
+    parser.add_argument("--pages", type=int, default=20, help="pages per benchmark")
+    parser.add_argument("--page-size", type=int, default=1000, help="log entries per page")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, the best is reported")
+    args = parser.parse_args()
+
+    print(f"JSON parser: {_json_loads.__module__}")
+    with ApiClient(Configuration()) as api_client:
+        bench_logs(api_client, [_log_page(args.page_size, page) for page in range(args.pages)], args.repeat)
+        bench_synthetics(api_client, [_synthetic_page(150) for _ in range(args.pages)], args.repeat)
+
+
+if __name__ == "__main__":
+    main()
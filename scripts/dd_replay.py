@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+
+import argparse
+import copy
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from utils.query import DATADOG_URL, REPLAY_URL_ENV
+
+# Local stand-in for the Datadog endpoints the report uses. `record` proxies to the real API
+# and saves each response as a fixture; `serve` answers from the fixtures with no credentials,
+# shifted into the requested time window and optionally multiplied and slowed down.
+# Point the report at either mode with DD_REPLAY_URL=http://127.0.0.1:<port>.
+
+FIXTURE_DIR = Path(".cache/replay")
+UPSTREAM_URL = f"https://api.{DATADOG_URL}"
+
+LOGS_PATH = "/api/v2/logs/events/search"
+EVENTS_PATH = "/api/v2/events/search"
+AGGREGATE_PATH = "/api/v2/logs/analytics/aggregate"
+SYNTHETIC_PREFIX = "/api/v1/synthetics/tests/"
+
+# Not forwarded upstream; the body is sent decompressed and the response is requested plain
+_HOP_HEADERS = {"host", "connection", "content-length", "content-encoding", "accept-encoding", "transfer-encoding"}
+
+
+def _is_synthetic(path: str) -> bool:
+    return path.startswith(SYNTHETIC_PREFIX) and path.endswith("/results")
+
+
+def is_replayable(path: str) -> bool:
+    return path in (LOGS_PATH, EVENTS_PATH, AGGREGATE_PATH) or _is_synthetic(path)
+
+
+def _to_ms(value) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def request_key(path: str, params: dict, body: dict | None) -> tuple[str, str, int | None, int | None]:
+    """
+    Split a request into (series, page, from ms, to ms). The series identifies the query with
+    its time window and cursor removed, so a fixture replays for any later window.
+    """
+    params = dict(params)
+    if body is not None:
+        body = copy.deepcopy(body)
+        query_filter = body.get("filter") or {}
+        time_from, time_to = query_filter.pop("from", None), query_filter.pop("to", None)
+        page = (body.get("page") or {}).pop("cursor", None) or ""
+    else:
+        time_from, time_to = params.pop("from_ts", None), params.pop("to_ts", None)
+        page = ""
+
+    series = hashlib.sha1(json.dumps([path, params, body], sort_keys=True).encode()).hexdigest()[:16]
+    return series, page, _to_ms(time_from), _to_ms(time_to)
+
+
+def _shift_iso(value: str, offset_ms: int) -> str:
+    shifted = datetime.fromisoformat(value.replace("Z", "+00:00")) + timedelta(milliseconds=offset_ms)
+    return shifted.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def _with_id(item: dict, copy_index: int, id_key: str) -> dict:
+    if copy_index == 0:
+        return item
+    return {**item, id_key: f"{item.get(id_key)}-{copy_index}"}
+
+
+def transform_response(path: str, response: dict, offset_ms: int, multiplier: int) -> dict:
+    """
+    Move a recorded response into the requested window and scale its volume by `multiplier`.
+    """
+    response = copy.deepcopy(response)
+
+    if path in (LOGS_PATH, EVENTS_PATH):
+        for item in response.get("data") or []:
+            attributes = item.get("attributes") or {}
+            if isinstance(attributes.get("timestamp"), str):
+                attributes["timestamp"] = _shift_iso(attributes["timestamp"], offset_ms)
+        data = response.get("data") or []
+        response["data"] = [_with_id(item, k, "id") for k in range(multiplier) for item in data]
+
+    elif path == AGGREGATE_PATH:
+        for bucket in (response.get("data") or {}).get("buckets") or []:
+            computes = bucket.get("computes") or {}
+            for name, value in computes.items():
+                if isinstance(value, list):
+                    for point in value:
+                        point["time"] = _shift_iso(point["time"], offset_ms)
+                        point["value"] = point["value"] * multiplier
+                elif isinstance(value, (int, float)):
+                    computes[name] = value * multiplier
+
+    elif _is_synthetic(path):
+        for result in response.get("results") or []:
+            result["check_time"] = result["check_time"] + offset_ms
+        if response.get("last_timestamp_fetched") is not None:
+            response["last_timestamp_fetched"] = response["last_timestamp_fetched"] + offset_ms
+        results = response.get("results") or []
+        response["results"] = [_with_id(result, k, "result_id") for k in range(multiplier) for result in results]
+
+    return response
+
+
+class FixtureStore:
+    """
+    One JSON file per series: its recorded window and each page's response, keyed by cursor
+    (logs, events) or recorded to_ts (synthetics), "" for the first page.
+    """
+
+    def __init__(self, fixture_dir: Path):
+        self.fixture_dir = Path(fixture_dir)
+        self._lock = threading.Lock()
+
+    def _path(self, series: str) -> Path:
+        return self.fixture_dir / f"{series}.json"
+
+    def load(self, series: str) -> dict | None:
+        path = self._path(series)
+        if not path.exists():
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def save_page(self, path: str, series: str, page: str, time_from: int | None, time_to: int | None, response: dict):
+        with self._lock:
+            fixture = self.load(series)
+            # A new window means a new recording run, so drop the pages of the old one
+            if fixture is None or fixture["from"] != time_from:
+                fixture = {"path": path, "from": time_from, "to": time_to, "pages": {}}
+            if _is_synthetic(path) and time_to != fixture["to"]:
+                page = str(time_to)
+            fixture["pages"][page] = response
+
+            self.fixture_dir.mkdir(parents=True, exist_ok=True)
+            with open(self._path(series), "w") as f:
+                json.dump(fixture, f)
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    server: "ReplayServer"
+    # Keep-alive, as the async client reuses connections; every response sends Content-Length
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _read_body(self) -> bytes:
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.headers.get("Content-Encoding") == "gzip":
+            raw = gzip.decompress(raw)
+        return raw
+
+    def _handle(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        raw_body = self._read_body()
+        body = json.loads(raw_body) if raw_body else None
+
+        if self.server.mode == "record":
+            self._record(url, params, body, raw_body)
+        else:
+            self._serve(url.path, params, body)
+
+    def _send_json(self, status: int, payload: dict | bytes):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _record(self, url: urllib.parse.SplitResult, params: dict, body: dict | None, raw_body: bytes):
+        headers = {name: value for name, value in self.headers.items() if name.lower() not in _HOP_HEADERS}
+        upstream = urllib.request.Request(
+            f"{self.server.upstream}{url.path}{'?' + url.query if url.query else ''}",
+            data=raw_body or None,
+            headers=headers,
+            method=self.command,
+        )
+        try:
+            with urllib.request.urlopen(upstream, timeout=self.server.upstream_timeout) as response:
+                status, data = response.status, response.read()
+                if response.headers.get("Content-Encoding") == "gzip":
+                    data = gzip.decompress(data)
+        except urllib.error.HTTPError as e:
+            status, data = e.code, e.read()
+
+        if 200 <= status <= 299 and is_replayable(url.path):
+            series, page, time_from, time_to = request_key(url.path, params, body)
+            self.server.store.save_page(url.path, series, page, time_from, time_to, json.loads(data))
+            print(f"Recorded {url.path} series {series} page {page or '<first>'}")
+        self._send_json(status, data)
+
+    def _serve(self, path: str, params: dict, body: dict | None):
+        if not is_replayable(path):
+            self._send_json(404, {"errors": [f"{path} is not replayed"]})
+            return
+
+        series, page, time_from, time_to = request_key(path, params, body)
+        fixture = self.server.store.load(series)
+        if fixture is None:
+            self._send_json(404, {"errors": [f"No fixture recorded for {path} series {series}"]})
+            return
+
+        offset = time_from - fixture["from"] if time_from is not None and fixture["from"] is not None else 0
+        if _is_synthetic(path) and time_to is not None and time_to - offset != fixture["to"]:
+            page = str(time_to - offset)
+        response = fixture["pages"].get(page)
+        if response is None:
+            self._send_json(404, {"errors": [f"No page {page!r} recorded for {path} series {series}"]})
+            return
+
+        delay = self.server.latency + random.uniform(0, self.server.jitter)
+        if delay:
+            time.sleep(delay)
+        self._send_json(200, transform_response(path, response, offset, self.server.multiplier))
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        mode: str,
+        fixture_dir: Path = FIXTURE_DIR,
+        upstream: str = UPSTREAM_URL,
+        multiplier: int = 1,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        upstream_timeout: float = 300,
+        verbose: bool = False,
+    ):
+        if mode not in ("record", "serve"):
+            raise ValueError(f"Unknown replay mode {mode!r} (expected 'record' or 'serve')")
+        super().__init__(address, ReplayHandler)
+        self.mode = mode
+        self.store = FixtureStore(fixture_dir)
+        self.upstream = upstream.rstrip("/")
+        self.multiplier = multiplier
+        self.latency = latency
+        self.jitter = jitter
+        self.upstream_timeout = upstream_timeout
+        self.verbose = verbose
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Record Datadog API responses as fixtures, or serve them locally.")
+    parser.add_argument("mode", choices=["record", "serve"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8126)
+    parser.add_argument("--fixture-dir", type=Path, default=FIXTURE_DIR)
+    parser.add_argument("--upstream", default=UPSTREAM_URL, help="Datadog API to record from")
+    parser.add_argument("--multiply", type=int, default=1, help="serve: repeat every log, event and synthetic result N times and scale counts")
+    parser.add_argument("--latency", type=float, default=0.0, help="serve: seconds to wait before each response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="serve: extra random delay of up to this many seconds")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    server = ReplayServer(
+        (args.host, args.port), args.mode, args.fixture_dir, args.upstream,
+        args.multiply, args.latency, args.jitter, verbose=args.verbose,
+    )
+    print(f"Datadog {args.mode} server on {server.url} using {args.fixture_dir}")
+    print(f"Run the report with {REPLAY_URL_ENV}={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
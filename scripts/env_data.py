@@ -1,11 +1,21 @@
+from __future__ import annotations
+
+import asyncio
 import sys
-import json
+import time
 
+import utils.async_query as aq
 import utils.query as q
 import utils.time_utils 
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.histogram import LogHistogram
 
-from dataclasses import dataclass
 from datadog_api_client import Configuration
+from anomaly import AnomalyScore, score_query
+from filemover import query_filemover_jobs, query_filemover_jobs_async
+from fleet import fleet_groups
+from profiling import profile_stage, profiled
+from query_plan import EnvPlan, PlannedQuery, QueryPlan, compile_plan
 
 class Result:
     name: str
@@ -15,8 +25,13 @@ class Result:
     aggregate: int
     yellow_threshold: int
     red_threshold: int
+    manual_threshold: int
     alert_level: int
     manual_review: bool
+    incomplete: bool
+    elapsed: float
+    error: str | None
+    anomaly: AnomalyScore | None
 
     def __init__(self, name: str, query: str, result_type: str, raw: int | list[dict], aggregate: int, yellow_threshold: int, red_threshold: int, manual_threshold: int):
         self.name = name
@@ -26,6 +41,11 @@ class Result:
         self.aggregate = aggregate
         self.yellow_threshold = yellow_threshold
         self.red_threshold = red_threshold
+        self.manual_threshold = manual_threshold
+        self.incomplete = False
+        self.elapsed = 0.0
+        self.error = None
+        self.anomaly = None
 
         if self.aggregate >= self.red_threshold:
             self.alert_level = 2
@@ -40,9 +60,29 @@ class Result:
             self.manual_review = False
 
 class AggregateResult(Result):
-    def __init__(self, name: str, query: str, aggregate: int, yellow_threshold: int, red_threshold: int, manual_threshold: int):
+    histogram: LogHistogram | None
+
+    def __init__(self, name: str, query: str, aggregate: int | LogHistogram, yellow_threshold: int, red_threshold: int, manual_threshold: int):
+        self.histogram = None
+        if isinstance(aggregate, LogHistogram):
+            self.histogram = aggregate
+            aggregate = aggregate.total
         super().__init__(name, query, "aggregate", aggregate, aggregate, yellow_threshold, red_threshold, manual_threshold)
 
+    def apply_peak_thresholds(self, yellow_threshold: int, red_threshold: int):
+        """
+        Raise the alert level if a single bucket crosses the peak thresholds, so a burst stands
+        out even when the window total looks normal.
+        """
+        if self.histogram is None:
+            return
+
+        peak = self.histogram.peak
+        if peak >= red_threshold:
+            self.alert_level = max(self.alert_level, 2)
+        elif peak >= yellow_threshold:
+            self.alert_level = max(self.alert_level, 1)
+
 
 class LogResult(Result):
     raw: list[dict]
@@ -70,37 +110,63 @@ class SyntheticResult(Result):
         self.failure_count = aggregate_failures
         super().__init__(name, synth_id, "synthetic", raw, aggregate_failures, yellow_threshold, red_threshold, manual_threshold)
 
+class FilemoverResult(Result):
+    raw: list[tuple[int, str, bool]]
+
+    def __init__(self, name: str, query: str, raw: list[tuple[int, str, bool]], yellow_threshold: int, red_threshold: int, manual_threshold: int):
+        failures = sum(1 for _, _, succeeded in raw if not succeeded)
+        super().__init__(name, query, "filemover", raw, failures, yellow_threshold, red_threshold, manual_threshold)
+
 class EnvData:
     env: str
     dd_config: Configuration
     _errs: dict[str, AggregateResult]
-    log_results: dict[str, LogResult]
+    log_results: dict[str, LogResult | FilemoverResult]
     event_results: dict[str, EventResult]
     synthetic_results: dict[str, SyntheticResult]
     alert_level = int
     manual_review = bool
+    incomplete = bool
     
     def __init__(
         self, 
         json_config: dict,
         start: str,
         end: str,
+        timerange: tuple[int, int] | None = None,
         ) -> EnvData:
 
-        self.env = json_config["name"]
-        self.timerange = utils.time_utils.normalize_time(start, end)
+        # A precomputed timerange keeps every env of a run on exactly the same window
+        self._reset(json_config["name"], timerange or utils.time_utils.normalize_time(start, end))
+
+        try:
+            self.dd_config = q.get_dd_config(json_config["API_KEY"], json_config["APP_KEY"])
+        except Exception as e:
+            print(f"Failed to create EnvData for {self.env} due to missing API or APP key")
+            sys.exit(1)
+
+    def _reset(self, env: str, timerange: tuple[int, int]):
+        self.env = env
+        self.timerange = timerange
         self._errs = {}
         self.log_results = {}
         self.event_results = {}
         self.synthetic_results = {}
         self.alert_level = 0
         self.manual_review = False
+        self.incomplete = False
 
-        try:
-            self.dd_config = q.get_dd_config(json_config["API_KEY"], json_config["APP_KEY"])
-        except Exception as e:
-            print(f"Failed to create EnvData for {self.env} due to missing API or APP key")
-            sys.exit(1)
+    @classmethod
+    def from_results(cls, env: str, timerange: tuple[int, int], results: list[Result]) -> EnvData:
+        """
+        Rebuild an EnvData from already computed results, without any Datadog credentials.
+        """
+        env_data = cls.__new__(cls)
+        env_data._reset(env, timerange)
+        env_data.dd_config = None
+        for result in results:
+            env_data.add_result(result)
+        return env_data
 
     def add_result(self, result: Result):
         if result.alert_level > self.alert_level:
@@ -109,9 +175,12 @@ class EnvData:
         if result.manual_review == True:
             self.manual_review = True
 
+        if result.incomplete:
+            self.incomplete = True
+
         if isinstance(result, AggregateResult):
             self._errs[result.name] = result
-        elif isinstance(result, LogResult):
+        elif isinstance(result, (LogResult, FilemoverResult)):
             self.log_results[result.name] = result
         elif isinstance(result, EventResult):
             self.event_results[result.name] = result
@@ -168,94 +237,292 @@ class EnvData:
 
 
 class EnvDataFactory:
+    query_map = {
+        "aggregate": q.query_log_count_aggregate,
+        "log": q.query_logs,
+        "event": q.query_events,
+        "synthetic": q.query_synthetic_test,
+        "filemover": query_filemover_jobs,
+    }
+
+    async_query_map = {
+        "aggregate": aq.query_log_count_aggregate,
+        "log": aq.query_logs,
+        "event": aq.query_events,
+        "synthetic": aq.query_synthetic_test,
+        "filemover": query_filemover_jobs_async,
+    }
+
+    result_class_map = {
+        "aggregate": AggregateResult,
+        "log": LogResult,
+        "event": EventResult,
+        "synthetic": SyntheticResult,
+        "filemover": FilemoverResult,
+    }
+
+    # What a result holds when its query returned nothing before failing or timing out
+    empty_raw_map = {
+        "aggregate": 0,
+        "log": [],
+        "event": [],
+        "synthetic": [],
+        "filemover": [],
+    }
+
     @staticmethod
-    def _build_aggregate_result(env_data: EnvData, query_name: str, query: str, yellow_threshold: int, red_threshold: int, manual_threshold: int) -> AggregateResult:
-        raw = q.query_log_count_aggregate(env_data.dd_config, query, env_data.timerange)
-        return AggregateResult(query_name, query, raw, yellow_threshold, red_threshold, manual_threshold)
-   
+    def _fetch(env_data: EnvData, planned: PlannedQuery, deadline: Deadline) -> tuple:
+        """
+        Run one query and return (raw, elapsed, error). Failures and timeouts keep whatever
+        partial data came back instead of aborting the run.
+        """
+        started = time.monotonic()
+        if deadline.expired():
+            print(f"Skipping {planned.type} query {planned.query} for env {env_data.env}: run deadline reached")
+            return EnvDataFactory.empty_raw_map[planned.type], 0.0, "skipped, run deadline reached"
+
+        print(f"Processing {planned.type} query {planned.query} for env {env_data.env}")
+        query_func = EnvDataFactory.query_map[planned.type]
+        try:
+            raw = query_func(env_data.dd_config, planned.query, env_data.timerange, deadline=deadline, **planned.options)
+            error = None
+        except DeadlineExceeded as e:
+            raw = e.partial if e.partial is not None else EnvDataFactory.empty_raw_map[planned.type]
+            error = str(e)
+        except Exception as e:
+            raw = EnvDataFactory.empty_raw_map[planned.type]
+            error = f"{type(e).__name__}: {e}"
+
+        elapsed = time.monotonic() - started
+        if error:
+            print(f"Query {planned.name} for env {env_data.env} is incomplete after {elapsed:.1f}s: {error}")
+        return raw, elapsed, error
+
     @staticmethod
-    def _build_log_result(env_data: EnvData, query_name: str, query: str, yellow_threshold: int, red_threshold: int, manual_threshold: int) -> LogResult:
-        raw = q.query_logs(env_data.dd_config, query, env_data.timerange)
-        return LogResult(query_name, query, raw, yellow_threshold, red_threshold, manual_threshold)
+    async def _fetch_async(
+        env_data: EnvData,
+        planned: PlannedQuery,
+        run_deadline: Deadline,
+        query_timeout: float | None,
+        semaphore: asyncio.Semaphore,
+    ) -> tuple:
+        """
+        Async version of _fetch. The semaphore bounds how many queries are in flight at once, and
+        the per-query timeout starts once a slot is free rather than while queued.
+        """
+        async with semaphore:
+            deadline = run_deadline.sooner(query_timeout)
+            started = time.monotonic()
+            if deadline.expired():
+                print(f"Skipping {planned.type} query {planned.query} for env {env_data.env}: run deadline reached")
+                return EnvDataFactory.empty_raw_map[planned.type], 0.0, "skipped, run deadline reached"
+
+            print(f"Processing {planned.type} query {planned.query} for env {env_data.env}")
+            query_func = EnvDataFactory.async_query_map[planned.type]
+            try:
+                raw = await query_func(env_data.dd_config, planned.query, env_data.timerange, deadline=deadline, **planned.options)
+                error = None
+            except DeadlineExceeded as e:
+                raw = e.partial if e.partial is not None else EnvDataFactory.empty_raw_map[planned.type]
+                error = str(e)
+            except Exception as e:
+                raw = EnvDataFactory.empty_raw_map[planned.type]
+                error = f"{type(e).__name__}: {e}"
+
+            elapsed = time.monotonic() - started
+            if error:
+                print(f"Query {planned.name} for env {env_data.env} is incomplete after {elapsed:.1f}s: {error}")
+            return raw, elapsed, error
 
     @staticmethod
-    def _build_event_result(env_data: EnvData, query_name: str, query: str, yellow_threshold: int, red_threshold: int, manual_threshold: int) -> EventResult:
-        raw = q.query_events(env_data.dd_config, query, env_data.timerange)
-        return EventResult(query_name, query, raw, yellow_threshold, red_threshold, manual_threshold)   
-    
+    def _build_result(env_data: EnvData, planned: PlannedQuery, fetched: dict, run_deadline: Deadline, query_timeout: float | None) -> Result:
+        if planned.fetch_key not in fetched:
+            fetched[planned.fetch_key] = EnvDataFactory._fetch(env_data, planned, run_deadline.sooner(query_timeout))
+        raw, elapsed, error = fetched[planned.fetch_key]
+
+        result_class = EnvDataFactory.result_class_map[planned.type]
+        result = result_class(
+            planned.name,
+            planned.query,
+            raw,
+            planned.yellow_threshold,
+            planned.red_threshold,
+            planned.manual_threshold,
+        )
+        result.elapsed = elapsed
+        result.error = error
+        result.incomplete = error is not None
+
+        if planned.anomaly is not None and not result.incomplete:
+            EnvDataFactory._score_anomaly(env_data, planned, result, run_deadline.sooner(query_timeout))
+        if planned.peak_red_threshold is not None:
+            result.apply_peak_thresholds(planned.peak_yellow_threshold, planned.peak_red_threshold)
+        return result
+
     @staticmethod
-    def _build_synthetic_result(env_data: EnvData, query_name: str, synth_id: str, yellow_threshold: int, red_threshold: int, manual_threshold: int) -> SyntheticResult:
-        raw = q.query_synthetic_test(env_data.dd_config, synth_id, env_data.timerange)
-        return SyntheticResult(query_name, synth_id, raw, yellow_threshold, red_threshold, manual_threshold)
-    
-    result_factory_map = {
-        "aggregate": _build_aggregate_result,
-        "log": _build_log_result,
-        "synthetic": _build_synthetic_result,
-        "event": _build_event_result
-    }
+    def _score_anomaly(env_data: EnvData, planned: PlannedQuery, result: Result, deadline: Deadline):
+        """
+        Replace the static threshold alert level with one based on deviation from the
+        seasonal baseline. Falls back to the static thresholds if there is no baseline yet.
+        """
+        try:
+            score = score_query(env_data.dd_config, planned.fetch_key, planned.query, env_data.timerange, result.aggregate, planned.anomaly, deadline)
+        except Exception as e:
+            print(f"Anomaly scoring failed for {planned.name} in env {env_data.env}, using static thresholds: {e}")
+            return
 
-    def _envdata_factory(
-        json_config: dict,
-        start: str,
-        end: str
-    ):
-        env_data = EnvData(json_config, start, end)
-
-        queries: dict = json_config.get("queries")
-        for query_name, query_config in queries.items():
-            query_config: dict                    
-            query_type = query_config.get("type") 
-            query = query_config.get("query")
-            red_threshold = query_config.get("red_threshold")
-            yellow_threshold = query_config.get("yellow_threshold", red_threshold)
-            manual_threshold = query_config.get("manual_threshold", 1)
-            
-            result_class = EnvDataFactory.result_factory_map.get(query_type)
-            if not result_class:
-                print(f"Unknown query type {query_type} in config for {env_data.env}")
+        if score is None:
+            print(f"No baseline history yet for {planned.name} in env {env_data.env}, using static thresholds")
+            return
+
+        print(f"Anomaly score for {planned.name} in env {env_data.env}: {score.current:.0f} vs baseline {score.baseline:.1f} (z={score.deviation:.2f})")
+        result.anomaly = score
+        result.alert_level = score.alert_level
+
+    @staticmethod
+    def _fetch_fleet(plan: QueryPlan, timerange: tuple[int, int], fetched: dict, run_deadline: Deadline, query_timeout: float | None):
+        """
+        Fetch each fleet group in one request and seed `fetched` with every member's count, so the
+        per-env pass finds them already fetched. A group that fails is left to the per-env queries.
+        """
+        for group in fleet_groups(plan):
+            deadline = run_deadline.sooner(query_timeout)
+            if deadline.expired():
+                print("Skipping remaining fleet queries: run deadline reached")
+                return
+
+            print(f"Processing fleet query {group.query} for {len(group.members)} envs")
+            started = time.monotonic()
+            try:
+                dd_config = q.get_dd_config(group.api_key, group.app_key)
+                counts = q.query_log_count_by_env(dd_config, group.query, timerange, group.envs, deadline=deadline, **group.options)
+            except Exception as e:
+                print(f"Fleet query {group.query} failed, falling back to per-env queries: {type(e).__name__}: {e}")
                 continue
-            print(f"Processing {query_type} query {query} for env {env_data.env}")
 
-            new_result = result_class(env_data, query_name, query, yellow_threshold, red_threshold, manual_threshold)
-            env_data.add_result(new_result)
+            elapsed = time.monotonic() - started
+            for env_value, fetch_key in group.members.items():
+                fetched[fetch_key] = (counts[env_value], elapsed, None)
+
+    @staticmethod
+    def _envdata_factory(
+        env_plan: EnvPlan,
+        start: str,
+        end: str,
+        fetched: dict | None = None,
+        run_deadline: Deadline | None = None,
+        query_timeout: float | None = None,
+        timerange: tuple[int, int] | None = None,
+    ) -> EnvData:
+        fetched = {} if fetched is None else fetched
+        run_deadline = run_deadline or Deadline()
+        env_data = EnvData(env_plan.env_config(), start, end, timerange)
+
+        with profile_stage(f"query {env_plan.name}"):
+            for planned in env_plan.queries:
+                if planned.fetch_key not in fetched:
+                    fetched[planned.fetch_key] = EnvDataFactory._fetch(env_data, planned, run_deadline.sooner(query_timeout))
+
+        with profile_stage(f"results {env_plan.name}"):
+            for planned in env_plan.queries:
+                env_data.add_result(EnvDataFactory._build_result(env_data, planned, fetched, run_deadline, query_timeout))
 
         return env_data
-    
-    def _build_result(
-        env_data: EnvData,
-        query_name: str,
-        query_config: dict
-    ) -> Result:
-        query_type = query_config.get("type") 
-        query = query_config.get("query")
-        red_threshold = query_config.get("red_threshold")
-        yellow_threshold = query_config.get("yellow_threshold", red_threshold)
-        
-        result_class = EnvDataFactory.result_factory_map.get(query_type)
-        if not result_class:
-            print(f"Unknown query type {query_type} in config for {env_data.env}")
-            return None
-        print(f"Processing {query_type} query {query} for env {env_data.env}")
 
-        return result_class(env_data, query_name, query, yellow_threshold, red_threshold)
-    
+    @classmethod
+    def from_plan(
+        cls,
+        plan: QueryPlan,
+        start: str,
+        end: str,
+        run_timeout: float | None = None,
+        query_timeout: float | None = None,
+        fleet: bool = False,
+    ) -> list[EnvData]:
+        # Shared across envs so identical queries on the same credentials are fetched once
+        fetched = {}
+        run_deadline = Deadline(run_timeout)
+        timerange = utils.time_utils.normalize_time(start, end)
+        if fleet:
+            with profile_stage("query fleet"):
+                cls._fetch_fleet(plan, timerange, fetched, run_deadline, query_timeout)
+        return [
+            cls._envdata_factory(env_plan, start, end, fetched, run_deadline, query_timeout, timerange)
+            for env_plan in plan.envs
+        ]
 
     @classmethod
+    @profiled("collect")
     def from_json_file(
         cls,
         path: str,
         start: str,
         end: str,
+        run_timeout: float | None = None,
+        query_timeout: float | None = None,
+        fleet: bool = False,
     ) -> list[EnvData]:
-        with open(path) as f:
-            json_config: dict = json.load(f)
-        
-        env_data_series: list = []
-        if type(json_config) is list:
-            for env in json_config:
-                env_data_series.append(EnvDataFactory._envdata_factory(env, start, end))
-        else:
-            env_data_series.append(EnvDataFactory._envdata_factory(json_config, start, end))
+        with profile_stage("compile plan"):
+            plan = compile_plan(path)
+        return cls.from_plan(plan, start, end, run_timeout, query_timeout, fleet)
+
+    @classmethod
+    async def from_plan_async(
+        cls,
+        plan: QueryPlan,
+        start: str,
+        end: str,
+        run_timeout: float | None = None,
+        query_timeout: float | None = None,
+        concurrency: int = 16,
+        fleet: bool = False,
+    ) -> list[EnvData]:
+        """
+        Same results as from_plan, but every distinct fetch in the plan runs concurrently on the
+        event loop, at most `concurrency` at a time.
+        """
+        run_deadline = Deadline(run_timeout)
+        semaphore = asyncio.Semaphore(concurrency)
+        timerange = utils.time_utils.normalize_time(start, end)
+        env_datas = [EnvData(env_plan.env_config(), start, end, timerange) for env_plan in plan.envs]
+
+        fetched = {}
+        if fleet:
+            with profile_stage("query fleet"):
+                # Only one request per query template, so a worker thread is enough here
+                await asyncio.to_thread(cls._fetch_fleet, plan, timerange, fetched, run_deadline, query_timeout)
+
+        # One task per fetch_key, so duplicated queries are still fetched once
+        pending = {}
+        for env_data, env_plan in zip(env_datas, plan.envs):
+            for planned in env_plan.queries:
+                if planned.fetch_key not in pending and planned.fetch_key not in fetched:
+                    pending[planned.fetch_key] = cls._fetch_async(env_data, planned, run_deadline, query_timeout, semaphore)
+
+        with profile_stage("query all envs (async)"):
+            fetched.update(zip(pending, await asyncio.gather(*pending.values())))
+
+        for env_data, env_plan in zip(env_datas, plan.envs):
+            with profile_stage(f"results {env_plan.name}"):
+                for planned in env_plan.queries:
+                    env_data.add_result(cls._build_result(env_data, planned, fetched, run_deadline, query_timeout))
+        return env_datas
 
-        return env_data_series
\ No newline at end of file
+    @classmethod
+    @profiled("collect")
+    def from_json_file_async(
+        cls,
+        path: str,
+        start: str,
+        end: str,
+        run_timeout: float | None = None,
+        query_timeout: float | None = None,
+        concurrency: int = 16,
+        fleet: bool = False,
+    ) -> list[EnvData]:
+        """
+        Blocking wrapper that runs from_plan_async on a fresh event loop.
+        """
+        with profile_stage("compile plan"):
+            plan = compile_plan(path)
+        return asyncio.run(cls.from_plan_async(plan, start, end, run_timeout, query_timeout, concurrency, fleet))
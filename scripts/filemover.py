@@ -0,0 +1,162 @@
+import asyncio
+import heapq
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import utils.async_query as aq
+import utils.query as q
+from datadog_api_client import Configuration
+from utils.deadline import Deadline, DeadlineExceeded
+
+# A job is flapping once its status flips at least this many times within the window
+FLAP_TRANSITIONS = 2
+
+# (timestamp ms, job name, succeeded)
+FilemoverRecord = tuple[int, str, bool]
+
+
+def _timestamp_ms(value) -> int:
+    if isinstance(value, datetime):
+        return int(value.timestamp() * 1000)
+    if isinstance(value, str):
+        return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() * 1000)
+    return int(value or 0)
+
+
+def _to_record(log, succeeded: bool) -> FilemoverRecord:
+    attributes = log["attributes"]
+    try:
+        job_name = attributes["attributes"]["fm_job"]["name"]
+    except (KeyError, TypeError):
+        job_name = "unknown"
+    return (_timestamp_ms(attributes.get("timestamp")), job_name, succeeded)
+
+
+def _stream_records(dd_config: Configuration, query: str, time_range: tuple[int, int], succeeded: bool, deadline: Deadline | None, records: list, raw_json: bool = False):
+    for page in q.iter_log_pages(dd_config, query, time_range, deadline, raw_json):
+        records.extend(_to_record(log, succeeded) for log in page)
+
+
+def query_filemover_jobs(
+    dd_config: Configuration,
+    query: str,
+    time_range: tuple[int, int],
+    deadline: Deadline | None = None,
+    success_query: str | None = None,
+    raw_json: bool = False,
+) -> list[FilemoverRecord]:
+    """
+    Fetch failed (and, if configured, successful) filemover runs as compact records, newest first.
+    Each page is reduced to records as it arrives so no SDK log objects are retained.
+    """
+    failures: list[FilemoverRecord] = []
+    successes: list[FilemoverRecord] = []
+    try:
+        _stream_records(dd_config, query, time_range, False, deadline, failures, raw_json)
+        if success_query:
+            _stream_records(dd_config, success_query, time_range, True, deadline, successes, raw_json)
+    except DeadlineExceeded as e:
+        partial = list(heapq.merge(failures, successes, key=lambda record: -record[0]))
+        raise DeadlineExceeded(f"{e} after {len(partial)} records", partial=partial) from e
+
+    # Both streams are already sorted newest first, so this is a single linear merge
+    return list(heapq.merge(failures, successes, key=lambda record: -record[0]))
+
+
+async def _stream_records_async(dd_config: Configuration, query: str, time_range: tuple[int, int], succeeded: bool, deadline: Deadline | None, records: list, raw_json: bool = False):
+    async for page in aq.iter_log_pages(dd_config, query, time_range, deadline, raw_json):
+        records.extend(_to_record(log, succeeded) for log in page)
+
+
+async def query_filemover_jobs_async(
+    dd_config: Configuration,
+    query: str,
+    time_range: tuple[int, int],
+    deadline: Deadline | None = None,
+    success_query: str | None = None,
+    raw_json: bool = False,
+) -> list[FilemoverRecord]:
+    """
+    Async version of query_filemover_jobs. The failure and success streams are paged concurrently.
+    """
+    failures: list[FilemoverRecord] = []
+    successes: list[FilemoverRecord] = []
+    streams = [_stream_records_async(dd_config, query, time_range, False, deadline, failures, raw_json)]
+    if success_query:
+        streams.append(_stream_records_async(dd_config, success_query, time_range, True, deadline, successes, raw_json))
+    try:
+        await asyncio.gather(*streams)
+    except DeadlineExceeded as e:
+        partial = list(heapq.merge(failures, successes, key=lambda record: -record[0]))
+        raise DeadlineExceeded(f"{e} after {len(partial)} records", partial=partial) from e
+
+    return list(heapq.merge(failures, successes, key=lambda record: -record[0]))
+
+
+@dataclass(slots=True)
+class FilemoverJob:
+    name: str
+    count: int = 0
+    successes: int = 0
+    last_failure: int | None = None
+    last_success: int | None = None
+    recent_success: bool = False
+    transitions: int = 0
+
+    @property
+    def flapping(self) -> bool:
+        return self.transitions >= FLAP_TRANSITIONS
+
+
+@dataclass
+class FilemoverSummary:
+    index: dict[str, FilemoverJob] = field(default_factory=dict)
+    num_total_failures: int = 0
+
+    @property
+    def jobs(self) -> dict[str, FilemoverJob]:
+        """
+        Jobs that failed at least once in the window.
+        """
+        return {name: job for name, job in self.index.items() if job.count}
+
+    @property
+    def num_distinct_failures(self) -> int:
+        return len(self.jobs)
+
+    @property
+    def flapping_jobs(self) -> list[str]:
+        return [name for name, job in self.index.items() if job.flapping]
+
+    def failure_counts(self) -> dict[str, int]:
+        return {name: job.count for name, job in self.jobs.items()}
+
+
+def analyze_filemover(records: list[FilemoverRecord]) -> FilemoverSummary:
+    """
+    Build the per-job index in one pass over records sorted newest first.
+    """
+    summary = FilemoverSummary()
+    previous_status: dict[str, bool] = {}
+    for timestamp, job_name, succeeded in records:
+        job = summary.index.get(job_name)
+        if job is None:
+            job = summary.index[job_name] = FilemoverJob(job_name)
+            # The first record seen for a job is its most recent attempt
+            job.recent_success = succeeded
+        elif succeeded != previous_status[job_name]:
+            job.transitions += 1
+
+        if succeeded:
+            job.successes += 1
+            if job.last_success is None:
+                job.last_success = timestamp
+        else:
+            job.count += 1
+            summary.num_total_failures += 1
+            if job.last_failure is None:
+                job.last_failure = timestamp
+
+        previous_status[job_name] = succeeded
+
+    return summary
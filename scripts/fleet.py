@@ -0,0 +1,66 @@
+import json
+import re
+from dataclasses import dataclass, field
+
+from query_plan import QueryPlan
+
+# A bare `env:<value>` tag, not `env:(a OR b)`, a wildcard such as `env:ulp-*` or part of another
+# attribute such as @service.env:x. The value has to end the term, so it can be swapped for a group.
+_ENV_TAG_RE = re.compile(r"(?<![\w@.:-])env:([\w.-]+)(?=[\s)]|$)")
+
+
+@dataclass
+class FleetGroup:
+    """
+    Aggregate queries that differ only in their env tag and share credentials and options,
+    fetched together as one query grouped by env. members maps each env tag value to the
+    fetch_key of the per-env query it replaces.
+    """
+    api_key: str
+    app_key: str
+    prefix: str
+    suffix: str
+    options: dict
+    members: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def envs(self) -> list[str]:
+        return list(self.members)
+
+    @property
+    def query(self) -> str:
+        return f"{self.prefix}({' OR '.join(self.envs)}){self.suffix}"
+
+
+def split_env_tag(query: str) -> tuple[str, str, str] | None:
+    """
+    Split a query into (text before, env value, text after) if it filters on exactly one env.
+    """
+    if query.count("env:") != 1:
+        return None
+    match = _ENV_TAG_RE.search(query)
+    if match is None:
+        return None
+    return query[:match.start(1)], match.group(1), query[match.end(1):]
+
+
+def fleet_groups(plan: QueryPlan) -> list[FleetGroup]:
+    """
+    Find aggregate queries that can be fetched for several envs at once. Only groups covering
+    at least two envs are returned; everything else keeps its per-env fetch.
+    """
+    groups: dict[tuple, FleetGroup] = {}
+    for env_plan in plan.envs:
+        for planned in env_plan.queries:
+            if planned.type != "aggregate":
+                continue
+            split = split_env_tag(planned.query)
+            if split is None:
+                continue
+
+            prefix, env_value, suffix = split
+            key = (env_plan.api_key, env_plan.app_key, prefix, suffix, json.dumps(planned.options, sort_keys=True))
+            group = groups.setdefault(key, FleetGroup(env_plan.api_key, env_plan.app_key, prefix, suffix, planned.options))
+            group.members.setdefault(env_value, planned.fetch_key)
+
+    return [group for group in groups.values() if len(group.members) > 1]
@@ -0,0 +1,84 @@
+import heapq
+import re
+from dataclasses import dataclass
+
+from utils.projection import is_projected
+
+# Kubernetes pod hashes only use these characters (no vowels, no 0/1/3), which is what keeps
+# ordinary hyphenated words such as out-of-memory-exception-error from looking like pods
+_POD_HASH = "[bcdfghjklmnpqrstvwxz2456789]"
+_POD_SUFFIX = f"-{_POD_HASH}{{8,10}}-{_POD_HASH}{{5}}"
+
+# One alternation so each message is scanned once. Order matters: the more specific
+# shapes have to win before the generic number mask eats their digits. A pod name may only
+# start at the beginning of a hyphenated word, so each word is scanned once, not once per hyphen.
+_MASK_RE = re.compile(
+    r"(?P<uuid>\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b)"
+    rf"|(?P<pod>(?<![\w-])[a-z][a-z0-9]*(?:-[a-z0-9]+)*{_POD_SUFFIX}(?![\w-]))"
+    r"|(?P<ip>\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b)"
+    r"|(?P<hex>\b0x[0-9a-fA-F]+\b|\b(?=[0-9a-fA-F]*\d)(?=[0-9a-fA-F]*[a-fA-F])[0-9a-fA-F]{8,}\b)"
+    r"|(?P<num>\b\d+(?:\.\d+)?\b)"
+)
+_POD_SUFFIX_RE = re.compile(f"{_POD_SUFFIX}$")
+
+_MAX_TEMPLATE_LENGTH = 300
+
+
+def _mask(match: re.Match) -> str:
+    kind = match.lastgroup
+    if kind == "pod":
+        # Keep the deployment name, it is usually what tells two causes apart
+        return _POD_SUFFIX_RE.sub("-<pod>", match.group())
+    return f"<{kind}>"
+
+
+def normalize_message(message: str) -> str:
+    return _MASK_RE.sub(_mask, message.strip()[:_MAX_TEMPLATE_LENGTH])
+
+
+def extract_message(record) -> str:
+    if is_projected(record):
+        return str(getattr(record, "message", None) or getattr(record, "title", None) or "")
+    attributes = record.get("attributes") or {}
+    message = attributes.get("message")
+    if not message:
+        message = (attributes.get("attributes") or {}).get("title")
+    return str(message or "")
+
+
+@dataclass
+class LogPattern:
+    template: str
+    count: int
+    sample: str
+
+
+def cluster_messages(messages, top_n: int = 5) -> tuple[list[LogPattern], int]:
+    """
+    Group messages by their masked template in a single streaming pass. Returns the top_n
+    most common patterns, each with one raw sample, and the number of distinct patterns.
+    """
+    counts: dict[str, int] = {}
+    samples: dict[str, str] = {}
+    for message in messages:
+        template = normalize_message(message)
+        if template in counts:
+            counts[template] += 1
+        else:
+            counts[template] = 1
+            samples[template] = message
+
+    top = heapq.nlargest(top_n, counts.items(), key=lambda item: item[1])
+    return [LogPattern(template, count, samples[template]) for template, count in top], len(counts)
+
+
+def has_messages(records) -> bool:
+    """
+    False for records projected without a message or title field, which can't be clustered.
+    """
+    first = records[0]
+    return not is_projected(first) or hasattr(first, "message") or hasattr(first, "title")
+
+
+def cluster_records(records, top_n: int = 5) -> tuple[list[LogPattern], int]:
+    return cluster_messages((extract_message(record) for record in records), top_n)
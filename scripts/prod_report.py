@@ -1,14 +1,19 @@
 #!/usr/bin/env python
 
+import argparse
 import json
 import os
 from dataclasses import dataclass
 from slack_messenger import SlackMessenger
 from dotenv import load_dotenv
-from jinja2 import Template
-from datetime import date
 from pathlib import Path
-from env_data import EnvDataFactory, LogResult
+from env_data import EnvData, EnvDataFactory
+from report_model import ReportModel, build_report_model
+from renderers import render_markdown, render_text
+from query_plan import compile_plan
+from sharding import SHARD_DIR, merge_shards, parse_shard, run_shard, run_sharded
+from snapshot import load_snapshot, write_snapshot
+from profiling import PROFILE_DIR, Profiler, profile_stage
 
 
 CONFIG_PATH = Path("config/config.json")
@@ -21,6 +26,8 @@ class AppConfig:
     output_path: Path
     template_path: Path
     output_channel_id: str
+    run_timeout: float | None = None
+    query_timeout: float | None = None
 
 def load_config(path: str = "config.json") -> AppConfig:
     with open(path, "r") as f:
@@ -32,63 +39,123 @@ def load_config(path: str = "config.json") -> AppConfig:
         query_path=Path(data["QUERY_PATH"]),
         output_path=Path(data["OUTPUT_PATH"]),  
         template_path=Path(data["TEMPLATE_PATH"]),
-        output_channel_id=data["OUTPUT_CHANNEL_ID"]
+        output_channel_id=data["OUTPUT_CHANNEL_ID"],
+        run_timeout=data.get("RUN_TIMEOUT_SECONDS"),
+        query_timeout=data.get("QUERY_TIMEOUT_SECONDS"),
     )
 
-def report_builder(config: AppConfig) -> str:
-    data = EnvDataFactory.from_json_file(config.query_path, config.time_from, config.time_to)
-
-    for env in data:
-        print(json.dumps(env, default=str, indent=2))
-    
-    with open(config.template_path) as f:
-        template = Template(f.read())
-
-    for env in data:
-        print(env)
-
-        if env.log_results.get('failed_fm_jobs'):
-            env.filtered_fm_jobs = identify_unique_filemover_jobs(env.log_results.get('failed_fm_jobs', {}))
-            print(env.filtered_fm_jobs)
-
-    output = template.render(
-        date=date.today(),
-        data=data
-    )
-
-    output_path = f"{config.output_path} Business Day Infra Report {date.today()}.md"
+def _shard_arg(value: str) -> tuple[int, int]:
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Query Datadog and post the ENV health report to Slack.")
+    parser.add_argument("--snapshot", type=Path, help="write the collected EnvData to this snapshot file (.jsonl or .jsonl.gz)")
+    parser.add_argument("--replay", type=Path, help="render from a snapshot file instead of querying Datadog")
+    parser.add_argument("--shard", type=_shard_arg, help="only query shard i of N (e.g. 0/4), write its partial snapshot and exit")
+    parser.add_argument("--merge", type=int, metavar="N", help="merge the snapshots of N shards instead of querying Datadog")
+    parser.add_argument("--workers", type=int, default=1, help="split environments across this many worker processes")
+    parser.add_argument("--fleet", action="store_true", help="fetch aggregate queries that differ only by env tag once for all envs sharing credentials")
+    parser.add_argument("--concurrency", type=int, help="fetch with the async transport, keeping at most N requests in flight")
+    parser.add_argument("--shard-dir", type=Path, default=SHARD_DIR, help="directory for partial shard snapshots")
+    parser.add_argument("--check-config", action="store_true", help="validate the query config and exit without querying Datadog")
+    parser.add_argument("--profile", type=Path, nargs="?", const=PROFILE_DIR, metavar="DIR", help="sample the run and write a flamegraph-compatible profile and per-stage breakdown to DIR")
+    parser.add_argument("--markdown", type=Path, nargs="?", const=True, metavar="PATH", help="also render the report with the configured template to PATH (default: a dated file next to OUTPUT_PATH)")
+    parser.add_argument("--text", action="store_true", help="also print the plain text report")
+    parser.add_argument("--dry-run", action="store_true", help="print the rendered Slack blocks instead of sending them")
+    return parser.parse_args()
+
+def collect_env_data(config: AppConfig, args: argparse.Namespace) -> list[EnvData]:
+    if args.replay:
+        with profile_stage("load snapshot"):
+            data = load_snapshot(args.replay)
+    elif args.merge:
+        with profile_stage("merge shards"):
+            data = merge_shards(config.query_path, args.merge, args.shard_dir)
+    else:
+        if args.workers > 1:
+            with profile_stage("collect (sharded)"):
+                data = run_sharded(
+                    config.query_path, config.time_from, config.time_to, args.workers, args.shard_dir,
+                    config.run_timeout, config.query_timeout, args.fleet,
+                )
+        elif args.concurrency:
+            data = EnvDataFactory.from_json_file_async(
+                config.query_path, config.time_from, config.time_to, config.run_timeout, config.query_timeout,
+                args.concurrency, args.fleet,
+            )
+        else:
+            data = EnvDataFactory.from_json_file(
+                config.query_path, config.time_from, config.time_to, config.run_timeout, config.query_timeout,
+                args.fleet,
+            )
+        if args.snapshot:
+            write_snapshot(data, args.snapshot)
+
+    return data
+
+def report_builder(config: AppConfig, model: ReportModel, output_path: Path | None = None) -> Path:
+    output = render_markdown(model, config.template_path)
+
+    if output_path is None:
+        output_path = Path(f"{config.output_path} Business Day Infra Report {model.date}.md")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
 
     with open(output_path, 'w') as out_f:
         out_f.write(output)
     
     print(output_path)
-    return str(output_path), data
+    return output_path
 
-def identify_unique_filemover_jobs(log_results: dict[str, LogResult]) -> set[str]:
-    unique_jobs: dict[str, int] = {}
+def run_report(args: argparse.Namespace):
+    with profile_stage("config"):
+        load_dotenv()
+        config = load_config(CONFIG_PATH)
 
-    for failed_job in log_results.raw:
-        print(failed_job['attributes']['attributes']['fm_job']['name'])
-        job_name = failed_job['attributes']['attributes']['fm_job']['name']
-        unique_jobs[job_name] = unique_jobs.get(job_name, 0) + 1
+    if args.check_config:
+        compile_plan(config.query_path)
+        return
 
-    return unique_jobs
+    if args.shard:
+        run_shard(
+            config.query_path, config.time_from, config.time_to, *args.shard, args.shard_dir,
+            config.run_timeout, config.query_timeout, args.fleet,
+        )
+        return
 
-def main():
-    load_dotenv()
-    config = load_config(CONFIG_PATH)
+    all_env_data = collect_env_data(config, args)
 
-    # report_builder(config)
+    with profile_stage("report model"):
+        model = build_report_model(all_env_data)
 
-    all_env_data = EnvDataFactory.from_json_file(config.query_path, config.time_from, config.time_to)
-    
-    for env in all_env_data:
-        if env.log_results.get('failed_fm_jobs'):
-            env.filtered_fm_jobs = identify_unique_filemover_jobs(env.log_results.get('failed_fm_jobs', {}))
+    if args.markdown:
+        with profile_stage("markdown"):
+            report_builder(config, model, None if args.markdown is True else args.markdown)
+    if args.text:
+        print(render_text(model))
 
-    messenger = SlackMessenger(all_env_data, token=os.getenv("SLACK_API_KEY"), channel_id=config.output_channel_id)
+    messenger = SlackMessenger(all_env_data, token=os.getenv("SLACK_API_KEY"), channel_id=config.output_channel_id, model=model)
     messenger.build_message()
+    if args.dry_run:
+        print(json.dumps(messenger.message_blocks, indent=2, ensure_ascii=False))
+        return
     messenger.send_message()
 
+def main():
+    args = parse_args()
+    if not args.profile:
+        run_report(args)
+        return
+
+    # Worker processes (--workers) are not sampled, only this process's stages
+    profiler = Profiler()
+    try:
+        with profiler:
+            run_report(args)
+    finally:
+        profiler.write(args.profile)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
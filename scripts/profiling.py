@@ -0,0 +1,170 @@
+import functools
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+
+PROFILE_DIR = Path(".cache/profile")
+SAMPLE_INTERVAL = 0.005
+
+# The profiler stages report into, if one is running. Stages are no-ops otherwise.
+_active_profiler: "Profiler | None" = None
+
+
+@dataclass
+class StageStats:
+    name: str
+    depth: int
+    seconds: float = 0.0
+    peak_bytes: int = 0
+    retained_bytes: int = 0
+    samples: int = 0
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class Profiler:
+    """
+    Samples the profiled thread's stack every `interval` seconds and tracks time and tracemalloc
+    memory per stage. Stacks are written in the collapsed format read by flamegraph.pl,
+    speedscope and inferno, rooted at the active stage.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stages: list[StageStats] = []
+        self.stacks: Counter[str] = Counter()
+        self._active: list[tuple[StageStats, int]] = []
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def __enter__(self) -> "Profiler":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        global _active_profiler
+        if _active_profiler is not None:
+            raise RuntimeError("A profiler is already running")
+        _active_profiler = self
+        self._thread_id = threading.get_ident()
+        tracemalloc.start()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample, name="profiler-sampler", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        global _active_profiler
+        self._stop.set()
+        self._sampler.join()
+        tracemalloc.stop()
+        _active_profiler = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            active = list(self._active)
+            if active:
+                active[-1][0].samples += 1
+            stages = [f"[{stats.name}]" for stats, _ in active]
+            self.stacks[";".join(stages + labels[::-1])] += 1
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time a stage and record its tracemalloc peak. Stages can nest; an outer stage's peak
+        includes its inner stages.
+        """
+        if self._active:
+            parent = self._active[-1][0]
+            parent.peak_bytes = max(parent.peak_bytes, tracemalloc.get_traced_memory()[1] - self._active[-1][1])
+        stats = StageStats(name, len(self._active))
+        self.stages.append(stats)
+        tracemalloc.reset_peak()
+        start_bytes = tracemalloc.get_traced_memory()[0]
+        self._active.append((stats, start_bytes))
+        started = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.seconds = time.perf_counter() - started
+            current, peak = tracemalloc.get_traced_memory()
+            stats.peak_bytes = max(stats.peak_bytes, peak - start_bytes)
+            stats.retained_bytes = current - start_bytes
+            self._active.pop()
+            if self._active:
+                parent, parent_start = self._active[-1]
+                parent.peak_bytes = max(parent.peak_bytes, peak - parent_start)
+
+    def summary(self) -> str:
+        lines = [f"{'stage':<40} {'seconds':>9} {'peak MiB':>9} {'kept MiB':>9} {'samples':>8}"]
+        for stats in self.stages:
+            lines.append(
+                f"{'  ' * stats.depth + stats.name:<40} {stats.seconds:9.3f} "
+                f"{stats.peak_bytes / 2**20:9.2f} {stats.retained_bytes / 2**20:9.2f} {stats.samples:8d}"
+            )
+        return "\n".join(lines)
+
+    def write(self, out_dir: str | Path = PROFILE_DIR) -> Path:
+        """
+        Write <stamp>.folded (collapsed stacks) and <stamp>-stages.json, print the stage
+        breakdown and return the .folded path.
+        """
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime("profile-%Y%m%d-%H%M%S")
+
+        folded_path = out_dir / f"{stamp}.folded"
+        with open(folded_path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(out_dir / f"{stamp}-stages.json", "w") as f:
+            json.dump({"interval": self.interval, "stages": [asdict(stats) for stats in self.stages]}, f, indent=2)
+
+        print(self.summary())
+        print(f"Wrote {sum(self.stacks.values())} stack samples to {folded_path}")
+        return folded_path
+
+
+@contextmanager
+def profile_stage(name: str):
+    """
+    Record `name` as a stage of the running profiler, or do nothing if none is running.
+    """
+    if _active_profiler is None:
+        yield None
+        return
+    with _active_profiler.stage(name) as stats:
+        yield stats
+
+
+def profiled(name: str):
+    """
+    Decorator form of profile_stage.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profile_stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import jsonschema
+
+from utils.projection import record_type
+from utils.query import REPLAY_URL_ENV
+
+PLAN_VERSION = 7
+PLAN_CACHE_DIR = Path(".cache/plans")
+
+QUERY_TYPES = ["aggregate", "log", "event", "synthetic", "filemover"]
+
+# Type-specific keys that are passed through to the query function as keyword arguments
+QUERY_OPTIONS = {
+    "aggregate": ["interval"],
+    "log": ["fields", "raw_json"],
+    "event": ["fields", "raw_json"],
+    "synthetic": ["raw_json"],
+    "filemover": ["success_query", "raw_json"],
+}
+
+_QUERY_SCHEMA = {
+    "type": "object",
+    "required": ["type", "query", "red_threshold"],
+    # Unknown keys are rejected so a misspelled threshold or option fails validation
+    "additionalProperties": False,
+    "properties": {
+        "type": {"enum": QUERY_TYPES},
+        "query": {"type": "string", "minLength": 1},
+        "red_threshold": {"type": "integer", "minimum": 0},
+        "yellow_threshold": {"type": "integer", "minimum": 0},
+        "manual_threshold": {"type": "integer", "minimum": 0},
+        "success_query": {"type": "string", "minLength": 1},
+        "interval": {"type": "string", "pattern": "^[0-9]+[smhdw]$"},
+        "raw_json": {"type": "boolean"},
+        "fields": {
+            "type": "array",
+            "minItems": 1,
+            "uniqueItems": True,
+            "items": {"type": "string", "pattern": "^@?[A-Za-z_][A-Za-z0-9_.-]*$"},
+        },
+        "peak_yellow_threshold": {"type": "integer", "minimum": 0},
+        "peak_red_threshold": {"type": "integer", "minimum": 0},
+        "anomaly": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                "weeks": {"type": "integer", "minimum": 1},
+                "yellow_z": {"type": "number"},
+                "red_z": {"type": "number"},
+            },
+        },
+    },
+}
+
+_ENV_SCHEMA = {
+    "type": "object",
+    "required": ["name", "API_KEY", "APP_KEY", "queries"],
+    "properties": {
+        "name": {"type": "string", "minLength": 1},
+        "API_KEY": {"type": "string", "minLength": 1},
+        "APP_KEY": {"type": "string", "minLength": 1},
+        "queries": {"type": "object", "additionalProperties": _QUERY_SCHEMA},
+    },
+}
+
+QUERIES_SCHEMA = {
+    "oneOf": [
+        {"type": "array", "items": _ENV_SCHEMA},
+        _ENV_SCHEMA,
+    ]
+}
+
+
+class ConfigError(ValueError):
+    pass
+
+
+@dataclass
+class PlannedQuery:
+    name: str
+    type: str
+    query: str
+    yellow_threshold: int
+    red_threshold: int
+    manual_threshold: int
+    fetch_key: str
+    options: dict = field(default_factory=dict)
+    anomaly: dict | None = None
+    peak_yellow_threshold: int | None = None
+    peak_red_threshold: int | None = None
+
+
+@dataclass
+class EnvPlan:
+    name: str
+    api_key: str
+    app_key: str
+    queries: list[PlannedQuery] = field(default_factory=list)
+
+    def env_config(self) -> dict:
+        return {"name": self.name, "API_KEY": self.api_key, "APP_KEY": self.app_key}
+
+
+@dataclass
+class QueryPlan:
+    content_hash: str
+    envs: list[EnvPlan]
+
+    @property
+    def fetch_count(self) -> int:
+        return len({query.fetch_key for env in self.envs for query in env.queries})
+
+    @property
+    def query_count(self) -> int:
+        return sum(len(env.queries) for env in self.envs)
+
+
+def _fetch_key(api_key: str, app_key: str, query_type: str, query: str, options: dict) -> str:
+    key = f"{api_key}\0{app_key}\0{query_type}\0{query}\0{json.dumps(options, sort_keys=True)}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def _compile_env(env_config: dict) -> EnvPlan:
+    env_plan = EnvPlan(env_config["name"], env_config["API_KEY"], env_config["APP_KEY"])
+
+    for query_name, query_config in env_config["queries"].items():
+        red_threshold = query_config["red_threshold"]
+        query_type = query_config["type"]
+        options = {key: query_config[key] for key in QUERY_OPTIONS.get(query_type, []) if key in query_config}
+        if "anomaly" in query_config and query_type != "aggregate":
+            raise ConfigError(f"{env_plan.name}/{query_name}: anomaly mode is only supported for aggregate queries")
+        if "fields" in query_config and query_type not in ("log", "event"):
+            raise ConfigError(f"{env_plan.name}/{query_name}: fields are only supported for log and event queries")
+        if "raw_json" in query_config and "raw_json" not in options:
+            raise ConfigError(f"{env_plan.name}/{query_name}: raw_json is not supported for {query_type} queries")
+        if "fields" in options:
+            try:
+                record_type(tuple(options["fields"]))
+            except ValueError as e:
+                raise ConfigError(f"{env_plan.name}/{query_name}: {e}") from e
+        peak_red_threshold = query_config.get("peak_red_threshold")
+        if peak_red_threshold is not None and "interval" not in options:
+            raise ConfigError(f"{env_plan.name}/{query_name}: peak thresholds need an aggregate query with an interval")
+        env_plan.queries.append(
+            PlannedQuery(
+                name=query_name,
+                type=query_type,
+                query=query_config["query"],
+                yellow_threshold=query_config.get("yellow_threshold", red_threshold),
+                red_threshold=red_threshold,
+                manual_threshold=query_config.get("manual_threshold", 1),
+                fetch_key=_fetch_key(env_plan.api_key, env_plan.app_key, query_type, query_config["query"], options),
+                options=options,
+                anomaly=query_config.get("anomaly"),
+                peak_yellow_threshold=query_config.get("peak_yellow_threshold", peak_red_threshold),
+                peak_red_threshold=peak_red_threshold,
+            )
+        )
+
+    return env_plan
+
+
+def _validate(json_config, path: Path):
+    validator = jsonschema.Draft202012Validator(QUERIES_SCHEMA)
+    errors = sorted(validator.iter_errors(json_config), key=lambda e: list(e.absolute_path))
+    if not errors:
+        return
+
+    # oneOf hides the useful message, so report the errors against the matching branch
+    branch = _ENV_SCHEMA if isinstance(json_config, dict) else QUERIES_SCHEMA["oneOf"][0]
+    details = [
+        f"  {'/'.join(str(p) for p in error.absolute_path) or '<root>'}: {error.message}"
+        for error in jsonschema.Draft202012Validator(branch).iter_errors(json_config)
+    ] or [f"  {error.message}" for error in errors]
+    raise ConfigError(f"Invalid query config {path}:\n" + "\n".join(details))
+
+
+def _check_credentials(plan: QueryPlan):
+    if os.getenv(REPLAY_URL_ENV):
+        return
+    missing = sorted({
+        key
+        for env in plan.envs
+        for key in (env.api_key, env.app_key)
+        if not os.getenv(key)
+    })
+    if missing:
+        raise ConfigError(f"Missing Datadog credentials in the environment: {', '.join(missing)}")
+
+
+def _load_cached_plan(content_hash: str) -> QueryPlan | None:
+    cache_path = PLAN_CACHE_DIR / f"{content_hash}.json"
+    if not cache_path.exists():
+        return None
+
+    # An unreadable cache file (e.g. from a crashed writer) is a miss; the plan is just recompiled
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+        envs = [
+            EnvPlan(env["name"], env["api_key"], env["app_key"], [PlannedQuery(**query) for query in env["queries"]])
+            for env in cached["envs"]
+        ]
+        return QueryPlan(cached["content_hash"], envs)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Ignoring unreadable plan cache {cache_path}: {e}")
+        return None
+
+
+def _write_cached_plan(plan: QueryPlan):
+    PLAN_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Write to a temp file and rename it into place, so concurrent readers never see a partial plan
+    with tempfile.NamedTemporaryFile("w", dir=PLAN_CACHE_DIR, suffix=".tmp", delete=False) as f:
+        json.dump(asdict(plan), f)
+    os.replace(f.name, PLAN_CACHE_DIR / f"{plan.content_hash}.json")
+
+
+def compile_plan(path: str | Path, check_credentials: bool = True) -> QueryPlan:
+    """
+    Validate a queries.json file and resolve it into an execution plan, before any API call
+    is made. Plans are cached by content hash, so an unchanged config is only validated once.
+    """
+    path = Path(path)
+    raw = path.read_bytes()
+    content_hash = hashlib.sha256(raw + f"\0plan-v{PLAN_VERSION}".encode()).hexdigest()[:20]
+
+    plan = _load_cached_plan(content_hash)
+    if plan is None:
+        try:
+            json_config = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise ConfigError(f"Invalid JSON in {path}: {e}") from e
+
+        _validate(json_config, path)
+        if isinstance(json_config, dict):
+            json_config = [json_config]
+
+        plan = QueryPlan(content_hash, [_compile_env(env_config) for env_config in json_config])
+        _write_cached_plan(plan)
+
+    if check_credentials:
+        _check_credentials(plan)
+
+    print(f"Compiled query plan {plan.content_hash}: {len(plan.envs)} environments, {plan.query_count} queries, {plan.fetch_count} distinct fetches")
+    return plan
@@ -0,0 +1,255 @@
+from functools import lru_cache
+from pathlib import Path
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from report_model import EnvView, ReportModel, ResultView
+from utils.time_utils import unix_to_iso
+
+TEMPLATE_CACHE_DIR = Path(".cache/jinja")
+
+
+@lru_cache(maxsize=None)
+def get_template_env(template_dir: str) -> Environment:
+    """
+    One Jinja Environment per template directory, with compiled templates kept in a
+    bytecode cache so repeat runs skip the parse step.
+    """
+    TEMPLATE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    return Environment(
+        loader=FileSystemLoader(template_dir),
+        bytecode_cache=FileSystemBytecodeCache(str(TEMPLATE_CACHE_DIR)),
+        auto_reload=False,
+    )
+
+
+def get_status_icon(obj: EnvView | ResultView) -> str:
+    if obj.alert_level == 2:
+        return "🔴"
+    elif obj.alert_level == 1:
+        return "🟡"
+    else:
+        return "🟢"
+
+
+def render_markdown(model: ReportModel, template_path: str | Path) -> str:
+    template_path = Path(template_path)
+    template = get_template_env(str(template_path.parent)).get_template(template_path.name)
+    return template.render(date=model.date, data=model.envs)
+
+
+def render_text(model: ReportModel) -> str:
+    lines = [f"ENV Health Status — {model.date.strftime('%Y-%m-%d')}"]
+    for env in model.envs:
+        lines.append(f"{env.name} [{'ok' if env.alert_level == 0 else 'warn' if env.alert_level == 1 else 'alert'}]")
+        for name, result in env.results.items():
+            incomplete = f" (incomplete: {result.error})" if result.incomplete else ""
+            baseline = f" (baseline {result.baseline:.1f}, z={result.deviation:+.2f})" if result.baseline is not None else ""
+            burst = f" {result.sparkline} peak {result.peak} (x{result.burst_ratio:.1f} mean)" if result.sparkline and result.aggregate else ""
+            lines.append(f"  {name}: {result.aggregate} [{result.elapsed:.1f}s]{baseline}{burst}{incomplete}")
+            for pattern in result.patterns:
+                lines.append(f"    {pattern.count} x {pattern.template}")
+        if env.filemover:
+            for name, job in env.filemover.jobs.items():
+                status = ", flapping" if job.flapping else ", succeeded on most recent attempt" if job.recent_success else ""
+                lines.append(f"  filemover {name}: {job.count}{status}")
+    return "\n".join(lines)
+
+
+def render_slack_blocks(model: ReportModel) -> list[dict]:
+    blocks = []
+    blocks.extend(_build_slack_header(model))
+    blocks.extend(_build_slack_summary(model))
+    blocks.extend(_build_slack_env_breakdowns(model))
+    return blocks
+
+
+def _build_slack_header(model: ReportModel) -> list[dict]:
+    env_list = [env.name for env in model.envs]
+    return [
+        {
+            "type": "header",
+            "text": {
+                "type": "plain_text",
+                "text": f"📊 ENV Health Status — {model.date.strftime('%Y-%m-%d')}",
+            },
+        },
+        {
+            "type": "context",
+            "elements": [
+                {
+                    "type": "mrkdwn",
+                    "text": (
+                        f"{len(env_list)} environments • "
+                        f"{', '.join(f'*{env_name}*' for env_name in env_list)}"
+                    ),
+                }
+            ],
+        },
+    ]
+
+
+def _build_slack_summary(model: ReportModel) -> list[dict]:
+    summary_blocks = []
+
+    if model.incomplete:
+        incomplete_lines = [
+            f"⏳ *{env.name}* — {', '.join(f'{name} ({result.elapsed:.0f}s)' for name, result in env.incomplete_results.items())}"
+            for env in model.incomplete
+        ]
+        summary_blocks.append(
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": "*Incomplete* _(counts are partial)_\n" + "\n".join(incomplete_lines),
+                }
+            }
+        )
+
+    if model.manual_review:
+        manual_review_lines = [f"🔎 *{env.name}* — {', '.join(f'{result.name} ({result.aggregate})' for result in env.manual_review_results.values())}" for env in model.manual_review]
+        summary_blocks.append(
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": "*Manual Review*\n" + "\n".join(manual_review_lines),
+                }
+            }
+        )
+
+    if model.green:
+        summary_blocks.append(
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"*No Errors:*\n🟢 *{', '.join(env.name for env in model.green)}*"
+                },
+            }
+        )
+
+    summary_blocks.append({"type": "divider"})
+    return summary_blocks
+
+
+def _format_count(result: ResultView) -> str:
+    if result.incomplete:
+        return f"≥{result.aggregate} ⏳"
+    text = str(result.aggregate)
+    if result.baseline is not None:
+        text += f" _(usually ~{result.baseline:.0f}, z={result.deviation:+.1f})_"
+    if result.sparkline and result.aggregate:
+        text += f" `{result.sparkline}` peak {result.peak} at {unix_to_iso(result.peak_start)}"
+    return text
+
+
+def _build_slack_env_fields(env: EnvView) -> list[dict]:
+    env_blocks = []
+    all_results = env.results
+
+    err_text = ""
+    for err in ["504", "502", "oom"]:
+        result = all_results.get(err)
+        if result:
+            err_text = err_text + f"*{get_status_icon(result)} {err}:* {_format_count(result)} \n"
+    result = all_results.get("503")
+    if result and (result.aggregate > 0 or result.incomplete):
+        err_text = err_text + f"*{get_status_icon(result)} 503:* {_format_count(result)} \n"
+    if err_text:
+        env_blocks.append({"type": "mrkdwn", "text": err_text})
+
+    if env.synthetics:
+        synthetic_parts = []
+        for result in env.synthetics.values():
+            icon = "⏳" if result.incomplete else "✅" if result.failure_count == 0 else "🔴"
+            synthetic_parts.append(f"`{result.name}` ({result.failure_count}) {icon} ")
+        env_blocks.append({"type": "mrkdwn", "text": "*Synthetic:* " + "\n".join(synthetic_parts)})
+
+    return env_blocks
+
+
+def _build_slack_filemover_context(env: EnvView) -> dict | None:
+    if not env.filemover_jobs:
+        return None
+
+    summary = env.filemover
+    fm_parts = []
+    for name, job in summary.jobs.items():
+        marker = " 🔁" if job.flapping else " ✅" if job.recent_success else ""
+        fm_parts.append(f"`{name}` ({job.count}){marker}")
+    return {
+        "type": "context",
+        "elements": [
+            {
+                "type": "mrkdwn",
+                "text": (
+                    f"*Filemover failures:* {summary.num_total_failures} total, {summary.num_distinct_failures} distinct — "
+                    + ", ".join(fm_parts)
+                ),
+            }
+        ],
+    }
+
+
+def _build_slack_patterns_context(env: EnvView) -> dict | None:
+    pattern_lines = []
+    for name, result in {**env.events, **env.logs}.items():
+        if not result.patterns:
+            continue
+        causes = "cause" if result.distinct_patterns == 1 else "causes"
+        top = ", ".join(f"`{pattern.template[:80]}` ({pattern.count})" for pattern in result.patterns)
+        pattern_lines.append(f"*{name}:* {result.distinct_patterns} distinct {causes} in {result.aggregate} {result.type}s — {top}")
+
+    if not pattern_lines:
+        return None
+    return {
+        "type": "context",
+        "elements": [{"type": "mrkdwn", "text": line} for line in pattern_lines],
+    }
+
+
+def _build_slack_incomplete_context(env: EnvView) -> dict | None:
+    if not env.incomplete:
+        return None
+
+    parts = [f"`{name}` after {result.elapsed:.0f}s ({result.error})" for name, result in env.incomplete_results.items()]
+    return {
+        "type": "context",
+        "elements": [
+            {
+                "type": "mrkdwn",
+                "text": "*Incomplete:* " + ", ".join(parts),
+            }
+        ],
+    }
+
+
+def _build_slack_env_breakdowns(model: ReportModel) -> list[dict]:
+    blocks = []
+    breakdown_envs = [*model.yellow, *model.red]
+    breakdown_envs += [env for env in model.incomplete if env not in breakdown_envs]
+    for env in breakdown_envs:
+        blocks.append(
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"*{env.name}*"
+                },
+                "fields": _build_slack_env_fields(env)
+            }
+        )
+
+        fm_context = _build_slack_filemover_context(env)
+        if fm_context:
+            blocks.append(fm_context)
+        patterns_context = _build_slack_patterns_context(env)
+        if patterns_context:
+            blocks.append(patterns_context)
+        incomplete_context = _build_slack_incomplete_context(env)
+        if incomplete_context:
+            blocks.append(incomplete_context)
+        blocks.append({"type": "divider"})
+    return blocks
@@ -0,0 +1,174 @@
+from dataclasses import dataclass, field
+from datetime import date
+from functools import cached_property
+
+from env_data import EnvData, EventResult, FilemoverResult, LogResult, Result, SyntheticResult
+from filemover import FilemoverSummary, analyze_filemover
+from log_patterns import LogPattern, cluster_records, has_messages
+
+PATTERN_TOP_N = 3
+
+
+@dataclass
+class ResultView:
+    name: str
+    type: str
+    aggregate: int
+    alert_level: int
+    manual_review: bool
+    failure_count: int = 0
+    incomplete: bool = False
+    elapsed: float = 0.0
+    error: str | None = None
+    patterns: list[LogPattern] = field(default_factory=list)
+    distinct_patterns: int = 0
+    baseline: float | None = None
+    deviation: float | None = None
+    sparkline: str | None = None
+    peak: int | None = None
+    peak_start: int | None = None
+    burst_ratio: float | None = None
+
+
+@dataclass
+class EnvView:
+    name: str
+    alert_level: int
+    manual_review: bool
+    incomplete: bool = False
+    errors: dict[str, ResultView] = field(default_factory=dict)
+    logs: dict[str, ResultView] = field(default_factory=dict)
+    events: dict[str, ResultView] = field(default_factory=dict)
+    synthetics: dict[str, ResultView] = field(default_factory=dict)
+    filemover: FilemoverSummary | None = None
+
+    @property
+    def filemover_jobs(self) -> dict[str, int]:
+        return self.filemover.failure_counts() if self.filemover else {}
+
+    @cached_property
+    def results(self) -> dict[str, ResultView]:
+        # Built once; the renderers read it many times and the views don't change after building
+        all_results = {}
+        all_results.update(self.errors)
+        all_results.update(self.logs)
+        all_results.update(self.events)
+        all_results.update(self.synthetics)
+        return all_results
+
+    @property
+    def manual_review_results(self) -> dict[str, ResultView]:
+        return {name: result for name, result in self.results.items() if result.manual_review}
+
+    @property
+    def incomplete_results(self) -> dict[str, ResultView]:
+        return {name: result for name, result in self.results.items() if result.incomplete}
+
+    @property
+    def filemover_failures(self) -> int:
+        return sum(self.filemover_jobs.values())
+
+    def aggregate(self, key: str) -> int:
+        result = self.results.get(key)
+        return result.aggregate if result else 0
+
+    def results_at_level(self, alert_level: int) -> list[ResultView]:
+        return [result for result in self.results.values() if result.alert_level == alert_level]
+
+
+@dataclass
+class ReportModel:
+    date: date
+    envs: list[EnvView]
+
+    @property
+    def red(self) -> list[EnvView]:
+        return [env for env in self.envs if env.alert_level == 2]
+
+    @property
+    def yellow(self) -> list[EnvView]:
+        return [env for env in self.envs if env.alert_level == 1]
+
+    @property
+    def green(self) -> list[EnvView]:
+        return [env for env in self.envs if env.alert_level == 0]
+
+    @property
+    def manual_review(self) -> list[EnvView]:
+        return [env for env in self.envs if env.manual_review]
+
+    @property
+    def incomplete(self) -> list[EnvView]:
+        return [env for env in self.envs if env.incomplete]
+
+
+def _histogram_fields(result: Result) -> dict:
+    histogram = getattr(result, "histogram", None)
+    if histogram is None:
+        return {}
+    return {
+        "sparkline": histogram.sparkline(),
+        "peak": histogram.peak,
+        "peak_start": histogram.peak_start,
+        "burst_ratio": histogram.burst_ratio,
+    }
+
+
+def _build_result_view(result: Result) -> ResultView:
+    patterns, distinct_patterns = [], 0
+    if isinstance(result, (LogResult, EventResult)) and result.raw and has_messages(result.raw):
+        patterns, distinct_patterns = cluster_records(result.raw, PATTERN_TOP_N)
+
+    return ResultView(
+        name=result.name,
+        type=result.type,
+        aggregate=result.aggregate,
+        alert_level=result.alert_level,
+        manual_review=result.manual_review,
+        failure_count=result.failure_count if isinstance(result, SyntheticResult) else 0,
+        incomplete=result.incomplete,
+        elapsed=result.elapsed,
+        error=result.error,
+        patterns=patterns,
+        distinct_patterns=distinct_patterns,
+        baseline=result.anomaly.baseline if result.anomaly else None,
+        deviation=result.anomaly.deviation if result.anomaly else None,
+        **_histogram_fields(result),
+    )
+
+
+def _build_filemover_summary(env: EnvData) -> FilemoverSummary | None:
+    records = [
+        record
+        for result in env.log_results.values() if isinstance(result, FilemoverResult)
+        for record in result.raw
+    ]
+    if not records:
+        return None
+    records.sort(key=lambda record: -record[0])
+    return analyze_filemover(records)
+
+
+def _build_env_view(env: EnvData) -> EnvView:
+    return EnvView(
+        name=env.env,
+        alert_level=env.alert_level,
+        manual_review=env.manual_review,
+        incomplete=env.incomplete,
+        errors={name: _build_result_view(result) for name, result in env._errs.items()},
+        logs={name: _build_result_view(result) for name, result in env.log_results.items()},
+        events={name: _build_result_view(result) for name, result in env.event_results.items()},
+        synthetics={name: _build_result_view(result) for name, result in env.synthetic_results.items()},
+        filemover=_build_filemover_summary(env),
+    )
+
+
+def build_report_model(data: list[EnvData], report_date: date | None = None) -> ReportModel:
+    """
+    Build the intermediate report model once per run. Every renderer reads from this
+    instead of walking EnvData itself.
+    """
+    return ReportModel(
+        date=report_date or date.today(),
+        envs=[_build_env_view(env) for env in data],
+    )
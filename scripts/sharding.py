@@ -0,0 +1,130 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from env_data import EnvData, EnvDataFactory
+from query_plan import QueryPlan, compile_plan
+from snapshot import load_snapshot, write_snapshot
+
+SHARD_DIR = Path(".cache/shards")
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """
+    Parse an 'i/N' shard spec, where i is 0-based.
+    """
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard {value!r} (expected 'i/N', e.g. '0/4')")
+
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard {value!r}: index must be in 0..{count - 1}")
+    return index, count
+
+
+def shard_assignments(env_names: list[str], shard_count: int) -> dict[str, int]:
+    """
+    Deal envs out round-robin in sorted name order. Every process and host that reads the same
+    queries.json gets the same split, and shard sizes differ by at most one env.
+    """
+    return {name: position % shard_count for position, name in enumerate(sorted(set(env_names)))}
+
+
+def shard_plan(plan: QueryPlan, index: int, count: int) -> QueryPlan:
+    assignments = shard_assignments([env.name for env in plan.envs], count)
+    envs = [env for env in plan.envs if assignments[env.name] == index]
+    return QueryPlan(plan.content_hash, envs)
+
+
+def shard_snapshot_path(shard_dir: Path, index: int, count: int) -> Path:
+    return Path(shard_dir) / f"shard-{index}-of-{count}.jsonl.gz"
+
+
+def run_shard(
+    query_path: str | Path,
+    start: str,
+    end: str,
+    index: int,
+    count: int,
+    shard_dir: Path = SHARD_DIR,
+    run_timeout: float | None = None,
+    query_timeout: float | None = None,
+    fleet: bool = False,
+) -> Path:
+    return _collect_shard(compile_plan(query_path), start, end, index, count, shard_dir, run_timeout, query_timeout, fleet)
+
+
+def _collect_shard(
+    full_plan: QueryPlan,
+    start: str,
+    end: str,
+    index: int,
+    count: int,
+    shard_dir: Path,
+    run_timeout: float | None,
+    query_timeout: float | None,
+    fleet: bool,
+) -> Path:
+    plan = shard_plan(full_plan, index, count)
+    print(f"Shard {index}/{count}: {', '.join(env.name for env in plan.envs) or 'no environments'}")
+
+    # Fleet groups only span the envs in this shard
+    data = EnvDataFactory.from_plan(plan, start, end, run_timeout, query_timeout, fleet)
+    path = shard_snapshot_path(shard_dir, index, count)
+    write_snapshot(data, path)
+    return path
+
+
+def merge_shards(query_path: str | Path, count: int, shard_dir: Path = SHARD_DIR, plan: QueryPlan | None = None) -> list[EnvData]:
+    """
+    Load every shard snapshot and return the envs in queries.json order. Pass the plan if it
+    is already compiled.
+    """
+    paths = [shard_snapshot_path(shard_dir, index, count) for index in range(count)]
+    missing = [str(path) for path in paths if not path.exists()]
+    if missing:
+        raise FileNotFoundError(f"Missing shard snapshots: {', '.join(missing)}")
+
+    by_name: dict[str, EnvData] = {}
+    for path in paths:
+        for env in load_snapshot(path):
+            if env.env in by_name:
+                raise ValueError(f"Environment {env.env} appears in more than one shard")
+            by_name[env.env] = env
+
+    plan = plan or compile_plan(query_path, check_credentials=False)
+    missing_envs = [env.name for env in plan.envs if env.name not in by_name]
+    ordered = [by_name.pop(env.name) for env in plan.envs if env.name in by_name]
+    if missing_envs:
+        print(f"Warning: no shard produced results for {', '.join(missing_envs)}")
+
+    return ordered + list(by_name.values())
+
+
+def run_sharded(
+    query_path: str | Path,
+    start: str,
+    end: str,
+    workers: int,
+    shard_dir: Path = SHARD_DIR,
+    run_timeout: float | None = None,
+    query_timeout: float | None = None,
+    fleet: bool = False,
+) -> list[EnvData]:
+    """
+    Run every shard in its own worker process, then merge the partial snapshots. The plan is
+    compiled once here and handed to the workers, so they never race on the plan cache.
+    """
+    plan = compile_plan(query_path)
+    for index in range(workers):
+        shard_snapshot_path(shard_dir, index, workers).unlink(missing_ok=True)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_collect_shard, plan, start, end, index, workers, shard_dir, run_timeout, query_timeout, fleet)
+            for index in range(workers)
+        ]
+        for future in futures:
+            future.result()
+
+    return merge_shards(query_path, workers, shard_dir, plan)
@@ -0,0 +1,166 @@
+import gzip
+import json
+from dataclasses import asdict
+from pathlib import Path
+
+import numpy as np
+
+from anomaly import AnomalyScore
+
+from env_data import AggregateResult, EnvData, EventResult, FilemoverResult, LogResult, Result, SyntheticResult
+from utils.histogram import LogHistogram
+from utils.projection import is_projected, record_type
+
+SNAPSHOT_VERSION = 1
+
+# Only these raw paths survive into a snapshot; everything the renderers read is covered.
+RAW_FIELDS = {
+    "log": ["id", "attributes.timestamp", "attributes.message", "attributes.attributes.fm_job.name"],
+    "event": ["id", "attributes.timestamp", "attributes.message", "attributes.attributes.title"],
+    "synthetic": ["result_id", "check_time", "probe_dc", "status", "result.passed"],
+}
+
+
+def _get_path(record, path: str):
+    value = record
+    for key in path.split("."):
+        try:
+            value = value[key]
+        except (KeyError, TypeError, IndexError):
+            return None
+    return value
+
+
+def _set_path(record: dict, path: str, value):
+    *parents, leaf = path.split(".")
+    for key in parents:
+        record = record.setdefault(key, {})
+    record[leaf] = value
+
+
+def project_raw(record, fields: list[str]) -> dict:
+    if hasattr(record, "to_dict"):
+        record = record.to_dict()
+
+    projected = {}
+    for path in fields:
+        value = _get_path(record, path)
+        if value is not None:
+            _set_path(projected, path, value)
+    return projected
+
+
+def result_to_record(result: Result) -> dict:
+    record = {
+        "name": result.name,
+        "type": result.type,
+        "query": result.query,
+        "aggregate": result.aggregate,
+        "yellow_threshold": result.yellow_threshold,
+        "red_threshold": result.red_threshold,
+        "manual_threshold": result.manual_threshold,
+        "elapsed": round(result.elapsed, 3),
+        "alert_level": result.alert_level,
+    }
+    if result.error is not None:
+        record["error"] = result.error
+    if result.anomaly is not None:
+        record["anomaly"] = asdict(result.anomaly)
+    if getattr(result, "histogram", None) is not None:
+        histogram = result.histogram
+        record["histogram"] = {
+            "start": histogram.start,
+            "interval_ms": histogram.interval_ms,
+            "counts": histogram.counts.tolist(),
+            "total": histogram.total,
+        }
+    fields = RAW_FIELDS.get(result.type)
+    # Aggregate results keep their count in raw, not a record list
+    if isinstance(result.raw, list) and result.raw and is_projected(result.raw[0]):
+        # Projected at fetch time: store the field list once and each record as a plain list
+        record["fields"] = list(type(result.raw[0]).source_fields)
+        record["raw"] = [list(entry) for entry in result.raw]
+    elif fields is not None:
+        record["raw"] = [project_raw(entry, fields) for entry in result.raw]
+    elif result.type == "filemover":
+        # Already compact (timestamp, job, succeeded) records
+        record["raw"] = result.raw
+    return record
+
+
+def _load_raw(record: dict) -> list:
+    if "fields" not in record:
+        return record["raw"]
+    projected = record_type(tuple(record["fields"]))
+    return [projected._make(entry) for entry in record["raw"]]
+
+
+def record_to_result(record: dict) -> Result:
+    args = (record["yellow_threshold"], record["red_threshold"], record["manual_threshold"])
+    result_type = record["type"]
+
+    if result_type == "aggregate":
+        aggregate = record["aggregate"]
+        if "histogram" in record:
+            histogram = record["histogram"]
+            aggregate = LogHistogram(histogram["start"], histogram["interval_ms"], np.array(histogram["counts"], dtype=np.int32), histogram["total"])
+        result = AggregateResult(record["name"], record["query"], aggregate, *args)
+    elif result_type == "log":
+        result = LogResult(record["name"], record["query"], _load_raw(record), *args)
+    elif result_type == "event":
+        result = EventResult(record["name"], record["query"], _load_raw(record), *args)
+    elif result_type == "synthetic":
+        result = SyntheticResult(record["name"], record["query"], record["raw"], *args)
+    elif result_type == "filemover":
+        result = FilemoverResult(record["name"], record["query"], [tuple(entry) for entry in record["raw"]], *args)
+    else:
+        raise ValueError(f"Unknown result type {result_type!r} in snapshot")
+
+    result.elapsed = record.get("elapsed", 0.0)
+    result.error = record.get("error")
+    result.incomplete = result.error is not None
+    if "anomaly" in record:
+        result.anomaly = AnomalyScore(**record["anomaly"])
+    # Anomaly scores and peak thresholds can move the level away from the static thresholds
+    result.alert_level = record.get("alert_level", result.alert_level)
+    return result
+
+
+def env_to_record(env: EnvData) -> dict:
+    return {
+        "v": SNAPSHOT_VERSION,
+        "env": env.env,
+        "timerange": list(env.timerange),
+        "results": [result_to_record(result) for result in env.get_all_results().values()],
+    }
+
+
+def record_to_env(record: dict) -> EnvData:
+    if record.get("v") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {record.get('v')!r}")
+
+    results = [record_to_result(result) for result in record["results"]]
+    return EnvData.from_results(record["env"], tuple(record["timerange"]), results)
+
+
+def _open(path: str | Path, mode: str):
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def write_snapshot(data: list[EnvData], path: str | Path):
+    """
+    Write one compact JSON line per env. Paths ending in .gz are gzip compressed.
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with _open(path, "w") as f:
+        for env in data:
+            f.write(json.dumps(env_to_record(env), separators=(",", ":"), default=str))
+            f.write("\n")
+    print(f"Wrote snapshot of {len(data)} environments to {path}")
+
+
+def load_snapshot(path: str | Path) -> list[EnvData]:
+    with _open(path, "r") as f:
+        return [record_to_env(json.loads(line)) for line in f if line.strip()]
@@ -0,0 +1,164 @@
+import asyncio
+import copy
+
+from datadog_api_client import AsyncApiClient, Configuration
+
+from datadog_api_client.v1.api.synthetics_api import SyntheticsApi
+
+from datadog_api_client.v2.api.events_api import EventsApi
+from datadog_api_client.v2.model.events_list_request import EventsListRequest
+from datadog_api_client.v2.model.events_request_page import EventsRequestPage
+from datadog_api_client.v2.api.logs_api import LogsApi
+from datadog_api_client.v2.model.logs_list_request import LogsListRequest
+from datadog_api_client.v2.model.logs_list_request_page import LogsListRequestPage
+from datadog_api_client.v2.model.logs_sort import LogsSort
+
+import utils.time_utils as time
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.histogram import LogHistogram
+from utils.projection import project_page
+from utils.query import _bucket_count, _count_request, _events_filter, _json_loads, _logs_filter
+
+# Async counterparts of the utils.query functions, built on AsyncApiClient (needs the
+# datadog-api-client[async] extra). Signatures and return values match the sync versions.
+
+
+async def _call_before_deadline(deadline: Deadline | None, request, partial: list | None = None):
+    """
+    Await one request, cancelling it if the deadline passes first. Running out of time raises
+    DeadlineExceeded carrying whatever was fetched so far.
+    """
+    fetched = f" after {len(partial)} records" if partial is not None else ""
+    remaining = deadline.remaining() if deadline is not None else None
+
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(f"deadline reached{fetched}", partial=partial)
+
+    try:
+        return await asyncio.wait_for(request(), remaining)
+    except TimeoutError as e:
+        raise DeadlineExceeded(f"request timed out{fetched}", partial=partial) from e
+
+
+def _client_config(dd_config: Configuration, raw_json: bool) -> Configuration:
+    if not raw_json:
+        return dd_config
+    config = copy.copy(dd_config)
+    config.preload_content = False
+    return config
+
+
+# These await the request themselves, so that passing them to _call_before_deadline puts the
+# body read under the deadline too; with raw_json most of the transfer happens there.
+
+async def _read_page(pending_response, raw_json: bool) -> tuple[list, dict]:
+    response = await pending_response
+    if raw_json:
+        body = _json_loads(await response.content())
+        return body.get("data") or [], body.get("meta") or {}
+    return response.data, response.meta.to_dict()
+
+
+async def _read_dict(pending_response, raw_json: bool) -> dict:
+    response = await pending_response
+    return _json_loads(await response.content()) if raw_json else response.to_dict()
+
+
+async def iter_log_pages(dd_config: Configuration, query_string: str, time_range: tuple[int, int], deadline: Deadline | None = None, raw_json: bool = False):
+    """
+    Async generator over pages of matching logs, newest first. Raises DeadlineExceeded without
+    partial data; callers track their own.
+    """
+    async with AsyncApiClient(_client_config(dd_config, raw_json)) as api_client:
+        api_instance = LogsApi(api_client)
+        query_body = LogsListRequest(
+            filter=_logs_filter(query_string, time_range),
+            sort=LogsSort.TIMESTAMP_DESCENDING,
+            page=LogsListRequestPage(limit=1000)
+        )
+
+        logs_processed = 0
+        while True:
+            response_data, response_metadata = await _call_before_deadline(
+                deadline, lambda: _read_page(api_instance.list_logs(body=query_body), raw_json)
+            )
+
+            logs_processed += len(response_data)
+            print(f"Processed {logs_processed} log entries...")
+            yield response_data
+
+            if not response_metadata.get('page', None):
+                break
+            query_body.page.cursor = response_metadata['page']['after']
+
+
+async def query_logs(dd_config: Configuration, query_string: str, time_range: tuple[int, int], deadline: Deadline | None = None, fields: list[str] | None = None, raw_json: bool = False) -> list:
+    """
+    With fields, each page is projected to compact records as it arrives (see utils.projection).
+    """
+    all_logs = []
+    try:
+        async for page in iter_log_pages(dd_config, query_string, time_range, deadline, raw_json):
+            all_logs.extend(project_page(page, fields) if fields else page)
+    except DeadlineExceeded as e:
+        raise DeadlineExceeded(f"{e} after {len(all_logs)} records", partial=all_logs) from e
+
+    return all_logs
+
+
+async def query_events(dd_config: Configuration, query_string: str, time_range: tuple[int, int], deadline: Deadline | None = None, fields: list[str] | None = None, raw_json: bool = False) -> list:
+    async with AsyncApiClient(_client_config(dd_config, raw_json)) as api_client:
+        api_instance = EventsApi(api_client)
+
+        query_body = EventsListRequest(
+            filter=_events_filter(query_string, time_range),
+            page=EventsRequestPage(limit=1000)
+        )
+
+        all_logs = []
+        while True:
+            response_data, response_metadata = await _call_before_deadline(
+                deadline, lambda: _read_page(api_instance.search_events(body=query_body), raw_json), all_logs
+            )
+
+            all_logs.extend(project_page(response_data, fields) if fields else response_data)
+            if not response_metadata.get('page', None):
+                break
+            query_body.page.cursor = response_metadata['page']['after']
+
+        return all_logs
+
+
+async def query_synthetic_test(dd_config: Configuration, test_id: str, time_range, deadline: Deadline | None = None, raw_json: bool = False) -> list[dict]:
+    time_from, time_to = time_range[0], time_range[1]
+
+    async with AsyncApiClient(_client_config(dd_config, raw_json)) as api_client:
+        api_instance = SyntheticsApi(api_client)
+
+        # Paginate results using last_timestamp_fetched (API output cuts off at 150 results)
+        synthetic_test_results = []
+        while time_to > time_from:
+            query_response = await _call_before_deadline(
+                deadline,
+                lambda: _read_dict(api_instance.get_api_test_latest_results(public_id=test_id, from_ts=time_from, to_ts=time_to), raw_json),
+                synthetic_test_results,
+            )
+
+            time_to = query_response["last_timestamp_fetched"]
+            synthetic_test_results += query_response["results"]
+
+        if synthetic_test_results:
+            print(f"Fetched {len(synthetic_test_results)} results for {test_id} from {time.unix_to_iso(synthetic_test_results[-1]['check_time'])} to {time.unix_to_iso(synthetic_test_results[0]['check_time'])}")
+        return synthetic_test_results
+
+
+async def query_log_count_aggregate(dd_config: Configuration, query_string: str, time_range: tuple[int, int], deadline: Deadline | None = None, interval: str | None = None) -> int | LogHistogram:
+    async with AsyncApiClient(dd_config) as api_client:
+        api_instance = LogsApi(api_client)
+
+        response = await _call_before_deadline(deadline, lambda: api_instance.aggregate_logs(
+            body=_count_request(query_string, time_range, interval)
+        ))
+
+        buckets = response.data.buckets
+        return _bucket_count(buckets[0] if buckets else None, time_range, interval)
@@ -0,0 +1,34 @@
+import time
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised by a query that ran out of time. Carries whatever was fetched before the deadline.
+    """
+    def __init__(self, message: str, partial=None):
+        super().__init__(message)
+        self.partial = partial
+
+
+class Deadline:
+    expires_at: float | None
+
+    def __init__(self, seconds: float | None = None):
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self) -> float | None:
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def sooner(self, seconds: float | None) -> "Deadline":
+        """
+        Return a deadline that expires at whichever comes first: this one or `seconds` from now.
+        """
+        child = Deadline(seconds)
+        if child.expires_at is None or (self.expires_at is not None and self.expires_at < child.expires_at):
+            child.expires_at = self.expires_at
+        return child
@@ -0,0 +1,63 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from utils.time_utils import _UNIT_MS
+
+_SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+def interval_to_ms(interval: str) -> int:
+    """
+    Convert a Datadog rollup interval such as '1h' or '15m' to milliseconds.
+    """
+    qty, unit = interval[:-1], interval[-1]
+    if not qty.isdigit() or unit not in _UNIT_MS:
+        raise ValueError(f"Unsupported interval {interval!r} (expected '<N><unit>', e.g. '1h')")
+    return int(qty) * _UNIT_MS[unit]
+
+
+@dataclass
+class LogHistogram:
+    """
+    Per-bucket log counts for an aggregate query: counts[i] covers
+    [start + i * interval_ms, start + (i + 1) * interval_ms). total is the exact count for the
+    queried range, since the first and last buckets can overhang it.
+    """
+    start: int
+    interval_ms: int
+    counts: np.ndarray
+    total: int
+
+    @classmethod
+    def from_points(cls, points: list[tuple[int, float]], time_range: tuple[int, int], interval_ms: int, total: int | None = None) -> "LogHistogram":
+        start = time_range[0] // interval_ms * interval_ms
+        size = max(-(-(time_range[1] - start) // interval_ms), 1)
+        counts = np.zeros(size, dtype=np.int32)
+        for timestamp, value in points:
+            index = (timestamp - start) // interval_ms
+            if 0 <= index < size:
+                counts[index] += int(value)
+        return cls(start, interval_ms, counts, int(counts.sum()) if total is None else total)
+
+    @property
+    def peak(self) -> int:
+        return int(self.counts.max()) if len(self.counts) else 0
+
+    @property
+    def peak_start(self) -> int:
+        return self.start + int(self.counts.argmax()) * self.interval_ms
+
+    @property
+    def burst_ratio(self) -> float:
+        """
+        Peak bucket over the mean bucket. ~1 means spread evenly, large values mean one burst.
+        """
+        mean = self.counts.mean() if len(self.counts) else 0
+        return float(self.peak / mean) if mean else 0.0
+
+    def sparkline(self) -> str:
+        if not self.peak:
+            return _SPARK_CHARS[0] * len(self.counts)
+        levels = np.ceil(self.counts / self.peak * (len(_SPARK_CHARS) - 1)).astype(int)
+        return "".join(_SPARK_CHARS[level] for level in levels)
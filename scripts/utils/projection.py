@@ -0,0 +1,67 @@
+import keyword
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# Top-level keys of a log or event response item; any other bare field lives under `attributes`
+_TOP_LEVEL = {"id", "type"}
+
+
+def field_path(field: str) -> tuple[str, ...]:
+    """
+    Map a Datadog-style field to its path in a log or event item: '@fm_job.name' is a custom
+    attribute (attributes.attributes.fm_job.name), 'timestamp' a reserved one (attributes.timestamp).
+    """
+    if field.startswith("@"):
+        return ("attributes", "attributes", *field[1:].split("."))
+    if field in _TOP_LEVEL:
+        return (field,)
+    return ("attributes", *field.split("."))
+
+
+def field_name(field: str) -> str:
+    name = re.sub(r"\W", "_", field.lstrip("@"))
+    if not name or name[0].isdigit() or keyword.iskeyword(name):
+        name = f"f_{name}"
+    return name
+
+
+@lru_cache(maxsize=None)
+def record_type(fields: tuple[str, ...]) -> type:
+    """
+    The tuple type projected records are stored as, one per distinct field list. Raises
+    ValueError if two fields map to the same attribute name.
+    """
+    names = [field_name(field) for field in fields]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Fields {list(fields)} collide after mapping to names {names}")
+
+    projected = namedtuple("ProjectedRecord", names)
+    projected.source_fields = fields
+    projected.paths = tuple(field_path(field) for field in fields)
+    return projected
+
+
+def _get(item, path: tuple[str, ...]):
+    value = item
+    for key in path:
+        try:
+            value = value.get(key)
+        except AttributeError:
+            return None
+        if value is None:
+            return None
+    return value
+
+
+def project_page(page, fields: list[str] | tuple[str, ...]) -> list[tuple]:
+    """
+    Reduce a page of SDK log or event items to compact records holding only `fields`, so the
+    model objects can be freed as soon as the page is processed.
+    """
+    projected = record_type(tuple(fields))
+    return [projected._make(_get(item, path) for path in projected.paths) for item in page]
+
+
+def is_projected(record) -> bool:
+    return hasattr(type(record), "source_fields")
@@ -1,4 +1,7 @@
+import copy
+import json
 import os
+import urllib3
 from datadog_api_client import ApiClient, Configuration
 
 from datadog_api_client.v1 import Configuration as V1Configuration
@@ -13,6 +16,8 @@ from datadog_api_client.v2.model.logs_aggregate_request import LogsAggregateRequ
 from datadog_api_client.v2.model.logs_query_filter import LogsQueryFilter
 from datadog_api_client.v2.model.logs_compute import LogsCompute
 from datadog_api_client.v2.model.logs_aggregation_function import LogsAggregationFunction
+from datadog_api_client.v2.model.logs_compute_type import LogsComputeType
+from datadog_api_client.v2.model.logs_group_by import LogsGroupBy
 from datadog_api_client.v2.model.logs_list_request import LogsListRequest
 from datadog_api_client.v2.model.logs_list_request_page import LogsListRequestPage
 from datadog_api_client.v2.model.logs_sort import LogsSort
@@ -20,12 +25,32 @@ from datadog_api_client.v2.model.events_request_page import EventsRequestPage
 
 
 import utils.time_utils as time
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.histogram import LogHistogram, interval_to_ms
+from utils.projection import project_page
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 DATADOG_URL = "datadoghq.com"
 
+# Set to a dd_replay.py server URL to send every query there instead of Datadog
+REPLAY_URL_ENV = "DD_REPLAY_URL"
+
 def get_dd_config(api_key: str, app_key: str) -> Configuration:
     ddconfig = Configuration()
     ddconfig.server_variables["site"] = DATADOG_URL
+
+    replay_url = os.getenv(REPLAY_URL_ENV)
+    if replay_url:
+        ddconfig.host = replay_url
+        # A serving replay server ignores credentials; a recording one forwards them if present
+        ddconfig.api_key["apiKeyAuth"] = os.getenv(api_key, "replay")
+        ddconfig.api_key["appKeyAuth"] = os.getenv(app_key, "replay")
+        return ddconfig
     
     if not os.getenv(api_key) or not os.getenv(app_key):
         raise KeyError("API_KEY and APP_KEY must be defined in the environment configuration.")
@@ -35,6 +60,64 @@ def get_dd_config(api_key: str, app_key: str) -> Configuration:
 
     return ddconfig
 
+def _apply_deadline(dd_config: Configuration, deadline: Deadline | None) -> Configuration:
+    """
+    Return a private copy of dd_config so per-request timeouts don't leak into other queries.
+    """
+    if deadline is None or deadline.remaining() is None:
+        return dd_config
+    return copy.copy(dd_config)
+
+def _client_config(dd_config: Configuration, deadline: Deadline | None, raw_json: bool) -> Configuration:
+    """
+    With raw_json, the client returns the undecoded HTTP response instead of SDK models, so a
+    page can be parsed straight to plain dicts with _read_page.
+    """
+    config = _apply_deadline(dd_config, deadline)
+    if raw_json:
+        if config is dd_config:
+            config = copy.copy(dd_config)
+        config.preload_content = False
+    return config
+
+def _read_json(response) -> dict:
+    try:
+        return _json_loads(response.data)
+    finally:
+        response.release_conn()
+
+def _read_page(response, raw_json: bool) -> tuple[list, dict]:
+    """
+    Return (data, meta) for a paginated list response, from either the SDK model or raw JSON.
+    """
+    if raw_json:
+        body = _read_json(response)
+        return body.get("data") or [], body.get("meta") or {}
+    return response.data, response.meta.to_dict()
+
+def _read_dict(response, raw_json: bool) -> dict:
+    return _read_json(response) if raw_json else response.to_dict()
+
+def _call_before_deadline(api_client: ApiClient, deadline: Deadline | None, request, partial: list | None = None):
+    """
+    Send one request with the remaining deadline as its timeout. Running out of time, before or
+    during the request, raises DeadlineExceeded carrying whatever was fetched so far. With
+    raw_json the body is only read by _read_page/_read_dict, so `request` has to include them.
+    """
+    fetched = f" after {len(partial)} records" if partial is not None else ""
+
+    if deadline is not None and deadline.remaining() is not None:
+        if deadline.expired():
+            raise DeadlineExceeded(f"deadline reached{fetched}", partial=partial)
+        api_client.configuration.request_timeout = deadline.remaining()
+
+    try:
+        return request()
+    except urllib3.exceptions.HTTPError as e:
+        if deadline is not None and deadline.expired():
+            raise DeadlineExceeded(f"request timed out{fetched}", partial=partial) from e
+        raise
+
 # TODO: Make DD config universal between v1/v2
 def get_v1_dd_config(env_config: dict) -> V1Configuration:
     v1_ddconfig = V1Configuration()
@@ -48,34 +131,45 @@ def get_v1_dd_config(env_config: dict) -> V1Configuration:
 
     return v1_ddconfig
 
-def query_logs(dd_config: Configuration, query_string: str, time_range: tuple[int, int]) -> list[dict]:
-    with ApiClient(dd_config) as api_client:
+def iter_log_pages(dd_config: Configuration, query_string: str, time_range: tuple[int, int], deadline: Deadline | None = None, raw_json: bool = False):
+    """
+    Yield each page of matching logs, newest first, so callers can reduce a page before the
+    next one is fetched. Raises DeadlineExceeded without partial data; callers track their own.
+    With raw_json, pages are plain dicts parsed from the response bytes instead of SDK models.
+    """
+    with ApiClient(_client_config(dd_config, deadline, raw_json)) as api_client:
         api_instance = LogsApi(api_client)
         query_body = LogsListRequest(
-                filter=LogsQueryFilter(
-                    query=query_string,
-                    _from=str(time_range[0]),
-                    to=str(time_range[1] )
-                ),
+                filter=_logs_filter(query_string, time_range),
                 sort=LogsSort.TIMESTAMP_DESCENDING,
                 page=LogsListRequestPage(limit=1000)
             )
 
-        all_logs = []
         logs_processed = 0
         while True:
-            response = api_instance.list_logs(body=query_body)
-            response_data = response.data
-            response_metadata = response.meta.to_dict()
+            response_data, response_metadata = _call_before_deadline(
+                api_client, deadline, lambda: _read_page(api_instance.list_logs(body=query_body), raw_json)
+            )
 
-            all_logs.extend(response_data)
             logs_processed += len(response_data)
             print(f"Processed {logs_processed} log entries...")
-                    
+            yield response_data
+
             if not response_metadata.get('page', None):
                 break
             query_body.page.cursor = response_metadata['page']['after']
 
+def query_logs(dd_config: Configuration, query_string: str, time_range: tuple[int, int], deadline: Deadline | None = None, fields: list[str] | None = None, raw_json: bool = False) -> list:
+    """
+    With fields, each page is projected to compact records as it arrives (see utils.projection).
+    """
+    all_logs = []
+    try:
+        for page in iter_log_pages(dd_config, query_string, time_range, deadline, raw_json):
+            all_logs.extend(project_page(page, fields) if fields else page)
+    except DeadlineExceeded as e:
+        raise DeadlineExceeded(f"{e} after {len(all_logs)} records", partial=all_logs) from e
+
     return all_logs
 
 def query_metric(dd_config: V1Configuration, query_string: str, time_range: tuple[int, int]) -> list[dict]:
@@ -94,43 +188,43 @@ def query_metric(dd_config: V1Configuration, query_string: str, time_range: tupl
         
         return timeseries
 
-def query_events(dd_config: Configuration, query_string: str, time_range: tuple[int, int]) -> list[dict]:
-    with ApiClient(dd_config) as api_client:
+def query_events(dd_config: Configuration, query_string: str, time_range: tuple[int, int], deadline: Deadline | None = None, fields: list[str] | None = None, raw_json: bool = False) -> list:
+    with ApiClient(_client_config(dd_config, deadline, raw_json)) as api_client:
         api_instance = EventsApi(api_client)
 
         query_body = EventsListRequest(
-            filter=EventsQueryFilter(
-                query=query_string,
-                _from=str(time_range[0]),
-                to=str(time_range[1])
-            ),
+            filter=_events_filter(query_string, time_range),
             page=EventsRequestPage(limit=1000)
         )
 
         all_logs = []
         while True:
-            response = api_instance.search_events(body=query_body)
-            response_data = response.data
-            response_metadata = response.meta.to_dict()
+            response_data, response_metadata = _call_before_deadline(
+                api_client, deadline, lambda: _read_page(api_instance.search_events(body=query_body), raw_json), all_logs
+            )
 
-            all_logs.extend(response_data)
+            all_logs.extend(project_page(response_data, fields) if fields else response_data)
             if not response_metadata.get('page', None):
                 break
             query_body.page.cursor = response_metadata['page']['after']
 
         return all_logs 
 
-def query_synthetic_test(dd_config: Configuration, test_id: str, time_range) -> dict:
+def query_synthetic_test(dd_config: Configuration, test_id: str, time_range, deadline: Deadline | None = None, raw_json: bool = False) -> dict:
     time_from, time_to = time_range[0], time_range[1]
 
-    with ApiClient(dd_config) as api_client:
+    with ApiClient(_client_config(dd_config, deadline, raw_json)) as api_client:
         api_instance = SyntheticsApi(api_client)
 
         # Paginate results using last_timestamp_fetched (API output cuts off at 150 results)
         synthetic_test_results = []
         print(f"Fetching synthetic results from {time.unix_to_iso(time_from)} to {time.unix_to_iso(time_to)}:")
         while time_to > time_from:
-            query_response = api_instance.get_api_test_latest_results(public_id=test_id, from_ts=time_from, to_ts=time_to).to_dict()
+            query_response = _call_before_deadline(
+                api_client, deadline,
+                lambda: _read_dict(api_instance.get_api_test_latest_results(public_id=test_id, from_ts=time_from, to_ts=time_to), raw_json),
+                synthetic_test_results,
+            )
             results = query_response["results"]
 
             print(f"\tFetched {len(results)} results from {time.unix_to_iso(results[-1]['check_time'])} to {time.unix_to_iso(results[0]['check_time'])}")
@@ -153,25 +247,84 @@ def query_synthetic_uptime(dd_config: Configuration, test_id: str, time_from: st
         synthetic_test_coverage = api_instance.fetch_uptimes(query_body)[0].to_dict()
         return synthetic_test_coverage
 
-def query_log_count_aggregate(dd_config: Configuration, query_string: str, time_range: tuple[int, int]) -> int:
-    with ApiClient(dd_config) as api_client:
+def query_log_count_aggregate(dd_config: Configuration, query_string: str, time_range: tuple[int, int], deadline: Deadline | None = None, interval: str | None = None) -> int | LogHistogram:
+    """
+    Count matching logs over the whole range. With an interval, the same request also returns
+    per-bucket counts and the result is a LogHistogram instead of an int.
+    """
+    with ApiClient(_apply_deadline(dd_config, deadline)) as api_client:
         api_instance = LogsApi(api_client)
 
-        response = api_instance.aggregate_logs(
-            body=LogsAggregateRequest(
-                filter=LogsQueryFilter(
-                    query=query_string,
-                    _from=str(time_range[0]),
-                    to=str(time_range[1]) 
-                ),
-                compute=[
-                    LogsCompute(
-                        aggregation=LogsAggregationFunction.COUNT
-                    )
-                ]
-            )
-        )
+        response = _call_before_deadline(api_client, deadline, lambda: api_instance.aggregate_logs(
+            body=_count_request(query_string, time_range, interval)
+        ))
+
+        buckets = response.data.buckets
+        return _bucket_count(buckets[0] if buckets else None, time_range, interval)
+
+def query_log_count_by_env(dd_config: Configuration, query_string: str, time_range: tuple[int, int], envs: list[str], deadline: Deadline | None = None, interval: str | None = None) -> dict[str, int | LogHistogram]:
+    """
+    Count matching logs for several envs in one request, grouped by the env tag. query_string
+    must already select all of `envs`; envs with no matching logs get a count of 0.
+    """
+    with ApiClient(_apply_deadline(dd_config, deadline)) as api_client:
+        api_instance = LogsApi(api_client)
+
+        response = _call_before_deadline(api_client, deadline, lambda: api_instance.aggregate_logs(
+            body=_count_request(query_string, time_range, interval, envs=envs)
+        ))
+
+        by_env = {bucket.by.get("env"): bucket for bucket in response.data.buckets or []}
+        return {env: _bucket_count(by_env.get(env), time_range, interval) for env in envs}
+
+# Request builders shared by the sync and async query functions
+
+def _logs_filter(query_string: str, time_range: tuple[int, int]) -> LogsQueryFilter:
+    return LogsQueryFilter(query=query_string, _from=str(time_range[0]), to=str(time_range[1]))
+
+def _events_filter(query_string: str, time_range: tuple[int, int]) -> EventsQueryFilter:
+    return EventsQueryFilter(query=query_string, _from=str(time_range[0]), to=str(time_range[1]))
+
+def _count_request(query_string: str, time_range: tuple[int, int], interval: str | None = None, total: bool = True, envs: list[str] | None = None) -> LogsAggregateRequest:
+    """
+    Count request body. With total, c0 is the total count and c1 the optional per-interval
+    timeseries; without it the timeseries is c0. envs groups the counts by env tag.
+    """
+    compute = []
+    if total:
+        compute.append(LogsCompute(aggregation=LogsAggregationFunction.COUNT))
+    if interval:
+        compute.append(LogsCompute(aggregation=LogsAggregationFunction.COUNT, type=LogsComputeType.TIMESERIES, interval=interval))
+
+    body = {"filter": _logs_filter(query_string, time_range), "compute": compute}
+    if envs:
+        body["group_by"] = [LogsGroupBy(facet="env", limit=len(envs))]
+    return LogsAggregateRequest(**body)
+
+def _bucket_count(bucket, time_range: tuple[int, int], interval: str | None) -> int | LogHistogram:
+    total = int(bucket.computes.get('c0', 0)) if bucket is not None else 0
+    if not interval:
+        return total
+    points = _parse_timeseries(bucket.computes.get('c1') or []) if bucket is not None else []
+    return LogHistogram.from_points(points, time_range, interval_to_ms(interval), total)
+
+def query_log_count_timeseries(dd_config: Configuration, query_string: str, time_range: tuple[int, int], interval: str = "1h", deadline: Deadline | None = None) -> list[tuple[int, float]]:
+    """
+    Count matching logs per `interval` bucket. Returns (bucket start ms, count) pairs; buckets
+    with no logs may be omitted by the API.
+    """
+    with ApiClient(_apply_deadline(dd_config, deadline)) as api_client:
+        api_instance = LogsApi(api_client)
+
+        response = _call_before_deadline(api_client, deadline, lambda: api_instance.aggregate_logs(
+            body=_count_request(query_string, time_range, interval, total=False)
+        ))
+
+        if not response.data.buckets:
+            return []
+        return _parse_timeseries(response.data.buckets[0].computes.get('c0') or [])
 
-        if response.data.buckets and len(response.data.buckets) > 0:
-            return int(response.data.buckets[0].computes.get('c0', 0))
-        return 0
\ No newline at end of file
+def _parse_timeseries(points) -> list[tuple[int, float]]:
+    # The SDK wraps the point list in a LogsAggregateBucketValueTimeseries model
+    points = getattr(points, "value", points)
+    return [(time.iso_to_unix_milliseconds(point['time']), float(point['value'])) for point in points]
@@ -1,7 +1,11 @@
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from zoneinfo import ZoneInfo
 import re
 
+REPORT_TZ = ZoneInfo("America/New_York")
+
+@lru_cache(maxsize=65536)
 def iso_to_unix_milliseconds(iso_time: str) -> int:
     """
     Convert an ISO 8601 formatted time string to Unix timestamp in milliseconds.
@@ -23,6 +27,11 @@ def time_range_iso_hours_ago(hours_ago: int) -> str:
     time_from = time_to - timedelta(hours=hours_ago)
     return time_from.isoformat(), time_to.isoformat()
 
+@lru_cache(maxsize=16384)
+def _format_minute(minute: int) -> str:
+    dt = datetime.fromtimestamp(minute * 60, tz=REPORT_TZ)
+    return dt.strftime("%b %#d, %Y at %#I:%M %p est")
+
 def unix_to_iso(unix_time: int | float) -> str:
     unix_time = float(unix_time)
 
@@ -30,8 +39,8 @@ def unix_to_iso(unix_time: int | float) -> str:
     if unix_time > 1_000_000_000_000:
         unix_time /= 1000.0
 
-    dt = datetime.fromtimestamp(unix_time, tz=ZoneInfo("America/New_York"))
-    return dt.strftime("%b %#d, %Y at %#I:%M %p est")
+    # The output has minute resolution, so the formatted string is cached per minute
+    return _format_minute(int(unix_time // 60))
 
 _UNIT_MS = {
     "s": 1000,
@@ -43,17 +52,21 @@ _UNIT_MS = {
 
 _NOW_RE = re.compile(r"^now(?:-(\d+)([smhdw]))?$")
 
-def _to_unix_ms(t: str, now_ms: int) -> int:
-    """
-    Convert 'now' or 'now-<N><unit>' to unix ms.
-    """
+@lru_cache(maxsize=256)
+def _offset_ms(t: str) -> int:
     m = _NOW_RE.match(t.strip())
     if not m:
         raise ValueError(f"Unsupported time format: {t!r} (expected 'now' or 'now-<N><unit>')")
     qty, unit = m.groups()
     if qty is None:
-        return now_ms
-    return now_ms - int(qty) * _UNIT_MS[unit]
+        return 0
+    return int(qty) * _UNIT_MS[unit]
+
+def _to_unix_ms(t: str, now_ms: int) -> int:
+    """
+    Convert 'now' or 'now-<N><unit>' to unix ms.
+    """
+    return now_ms - _offset_ms(t)
 
 def normalize_time(time_from: str, time_to: str) -> tuple[int, int]:
     now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
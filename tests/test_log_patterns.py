@@ -0,0 +1,34 @@
+import pytest
+
+from log_patterns import cluster_messages, normalize_message
+
+
+@pytest.mark.parametrize("message, template", [
+    ("connect to ip-10-0-1-23 failed", "connect to ip-<num>-<num>-<num>-<num> failed"),
+    ("out-of-memory-exception-error in worker", "out-of-memory-exception-error in worker"),
+    ("pod api-server-7d4b9c8f6-x2k9p restarted", "pod api-server-<pod> restarted"),
+    ("retry 3 of 5 took 1.5 s", "retry <num> of <num> took <num> s"),
+    ("upstream 10.0.3.4:8080 reset", "upstream <ip> reset"),
+    ("request 0b2f6a1e-9c3d-4e5f-8a7b-1c2d3e4f5a6b done", "request <uuid> done"),
+])
+def test_normalize_message(message, template):
+    assert normalize_message(message) == template
+
+
+def test_hyphenated_words_stay_separate_patterns():
+    _, distinct = cluster_messages(["out-of-memory-exception-error", "out-of-memory-killer-error"])
+    assert distinct == 2
+
+
+def test_hyphen_heavy_messages_mask_and_cluster():
+    messages = [
+        "-".join(["a1b2"] * 50) + f" retry {attempt}"
+        for attempt in range(3)
+    ] + ["stage-1-2-3-4-5-6-7-8-9-10 failed on ip-10-0-1-23"]
+
+    assert normalize_message(messages[0]) == "-".join(["a1b2"] * 50) + " retry <num>"
+    assert normalize_message(messages[-1]) == "stage-" + "-".join(["<num>"] * 10) + " failed on ip-<num>-<num>-<num>-<num>"
+
+    patterns, distinct = cluster_messages(messages)
+    assert distinct == 2
+    assert [(pattern.count, pattern.sample) for pattern in patterns] == [(3, messages[0]), (1, messages[-1])]
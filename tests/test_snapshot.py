@@ -0,0 +1,66 @@
+import numpy as np
+
+from anomaly import AnomalyScore
+from env_data import AggregateResult, EnvData, EventResult, FilemoverResult, LogResult, SyntheticResult
+from snapshot import load_snapshot, write_snapshot
+from utils.histogram import LogHistogram
+from utils.projection import project_page
+
+TIMERANGE = (1736100000000, 1736186400000)
+
+
+def _log(message: str, job: str) -> dict:
+    return {
+        "id": f"log-{job}",
+        "attributes": {
+            "timestamp": "2025-01-06T14:03:12.123Z",
+            "message": message,
+            "attributes": {"fm_job": {"name": job}, "title": message},
+        },
+    }
+
+
+def _results() -> list:
+    logs = [_log("job failed: exit=1", "ingest-1"), _log("job failed: exit=2", "ingest-2")]
+
+    counted = AggregateResult("504", "status:504", 12, 5, 10, 20)
+    counted.anomaly = AnomalyScore(current=12.0, baseline=4.0, deviation=3.2, weeks=4, alert_level=2)
+    histogram = LogHistogram(TIMERANGE[0], 3600000, np.array([0, 3, 1], dtype=np.int32), 4)
+    return [
+        counted,
+        AggregateResult("502", "status:502", 0, 5, 10, 20),
+        AggregateResult("503", "status:503", histogram, 5, 10, 20),
+        LogResult("fm_logs", "service:filemover", logs, 1, 2, 3),
+        EventResult("oom", "oom", logs, 1, 2, 3),
+        EventResult("oom_projected", "oom", project_page(logs, ["timestamp", "message", "@title"]), 1, 2, 3),
+        SyntheticResult("allocore", "abc-def-ghi", [
+            {"result_id": "1", "check_time": 1736172000000.0, "probe_dc": "aws:us-east-1", "status": 0, "result": {"passed": True}},
+            {"result_id": "2", "check_time": 1736171940000.0, "probe_dc": "aws:us-east-1", "status": 1, "result": {"passed": False}},
+        ], 1, 2, 3),
+        FilemoverResult("failed_fm_jobs", "service:filemover", [(1736172000000, "ingest-1", False), (1736171000000, "ingest-1", True)], 1, 2, 3),
+    ]
+
+
+def test_snapshot_round_trip_covers_every_result_type(tmp_path):
+    env = EnvData.from_results("ULP", TIMERANGE, _results())
+    path = tmp_path / "snapshot.jsonl.gz"
+    write_snapshot([env], path)
+
+    [loaded] = load_snapshot(path)
+    assert loaded.env == "ULP"
+    assert loaded.timerange == TIMERANGE
+
+    expected, actual = env.get_all_results(), loaded.get_all_results()
+    assert set(actual) == set(expected)
+    for name, result in expected.items():
+        restored = actual[name]
+        assert type(restored) is type(result)
+        assert restored.aggregate == result.aggregate
+        assert restored.alert_level == result.alert_level
+        assert restored.anomaly == result.anomaly
+
+    assert actual["503"].histogram.counts.tolist() == [0, 3, 1]
+    assert actual["oom_projected"].raw == expected["oom_projected"].raw
+    assert actual["oom"].raw[0]["attributes"]["message"] == "job failed: exit=1"
+    assert actual["failed_fm_jobs"].raw == expected["failed_fm_jobs"].raw
+    assert actual["allocore"].failure_count == 1